@@ -42,6 +42,36 @@ class Settings(BaseSettings):
     model_path: str = "../ml_module/models"
     retrain_interval_days: int = 7
     min_data_points_for_forecast: int = 30
+    short_history_days: int = 60
+    global_model_trees: int = 100
+    global_model_n_jobs: int = -1
+    global_model_max_rows: int = 500000
+    global_model_horizon: int = 60
+    forecast_scheduler_enabled: bool = True
+    forecast_scheduler_check_seconds: int = 3600
+    precomputed_forecast_days: int = 90
+    forecast_job_ttl_seconds: int = 3600
+    forecast_job_max_entries: int = 1000
+    elasticity_cache_max_tenants: int = 500
+    simulation_max_cells: int = 5000000
+    segmentation_window_days: int = 91
+    segmentation_refresh_minutes: int = 15
+    segmentation_max_tenants: int = 500
+    sales_bulk_batch_size: int = 500
+    response_cache_backend: str = "memory"
+    response_cache_url: str = "redis://localhost:6379/0"
+    response_cache_ttl_seconds: int = 300
+    response_cache_max_entries: int = 2048
+    model_cache_max_entries: int = 256
+    model_cache_max_age_hours: int = 336
+    model_cache_max_disk_mb: int = 512
+    forecast_workers: int = 0
+    forecast_queue_depth: int = 32
+    forecast_queue_wait_seconds: float = 10.0
+    forecast_job_timeout_seconds: float = 120.0
+    forecast_worker_max_tasks: int = 50
+    forecast_chunk_size: int = 8
+    forecast_time_budget_ms: int = 10000
     
     @property
     def cors_origins_list(self) -> List[str]:
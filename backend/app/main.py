@@ -1,15 +1,53 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, EmailStr
+from contextlib import asynccontextmanager
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import os
 from dotenv import load_dotenv
 
+from app.config import settings
+from app.database import connect_to_mongo, close_mongo_connection, get_database
+from app.utils.rollups import ensure_rollup_indexes
+
 load_dotenv()
 
-app = FastAPI(title="Nigeria Property Hub API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await connect_to_mongo()
+    
+    # The rollup upserts rely on these unique indexes to keep one row per
+    # bucket, so they are created whether or not the scheduler runs.
+    try:
+        await ensure_rollup_indexes(get_database())
+    except Exception as e:
+        print(f"Failed to create rollup indexes: {e}")
+    
+    scheduler = None
+    if settings.forecast_scheduler_enabled:
+        from app.ml.scheduler import get_retrain_scheduler
+        
+        try:
+            scheduler = get_retrain_scheduler()
+            scheduler.start()
+        except Exception as e:
+            scheduler = None
+            print(f"Forecast retraining scheduler not started: {e}")
+    
+    yield
+    
+    if scheduler is not None:
+        from app.ml.executor import shutdown_forecast_executor
+        
+        await scheduler.stop()
+        shutdown_forecast_executor()
+    await close_mongo_connection()
+
+
+app = FastAPI(title="Nigeria Property Hub API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
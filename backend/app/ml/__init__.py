@@ -1,3 +1,18 @@
-from app.ml.forecaster import DemandForecaster
+from app.ml.forecaster import DemandForecaster, get_forecaster
+from app.ml.model_cache import ModelCache
+from app.ml.executor import (
+    ForecastExecutor,
+    ForecastQueueFullError,
+    get_forecast_executor,
+    shutdown_forecast_executor,
+)
 
-__all__ = ["DemandForecaster"]
+__all__ = [
+    "DemandForecaster",
+    "get_forecaster",
+    "ModelCache",
+    "ForecastExecutor",
+    "ForecastQueueFullError",
+    "get_forecast_executor",
+    "shutdown_forecast_executor",
+]
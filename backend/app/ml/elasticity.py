@@ -0,0 +1,169 @@
+import asyncio
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from bson import ObjectId
+
+from app.config import settings
+from app.database import get_collection
+
+
+MIN_OBSERVATIONS = 8
+ELASTICITY_BOUNDS = (-10.0, 0.0)
+
+# A slope is only trusted when it is significant and prices actually moved
+# (standard deviation of log price, roughly a 5% spread).
+MIN_T_STATISTIC = 2.0
+MIN_LOG_PRICE_STD = 0.05
+
+# Sales are read again this far behind the newest created_at seen, since
+# concurrent writers do not commit in created_at order.
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+# Per-product running sums for the log-log fit: n, sum x, sum y, sum x^2,
+# sum xy, sum y^2.
+N_SUMS = 6
+
+
+def elasticity_sums(sales: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+    product_ids, prices, quantities = [], [], []
+    for sale in sales:
+        for item in sale.get("items", []):
+            product_ids.append(item["product_id"])
+            prices.append(item.get("unit_price", 0))
+            quantities.append(item.get("quantity", 0))
+
+    if not product_ids:
+        return np.array([], dtype=object), np.zeros((0, N_SUMS))
+
+    prices = np.asarray(prices, dtype=float)
+    quantities = np.asarray(quantities, dtype=float)
+    valid = (prices > 0) & (quantities > 0)
+
+    unique_ids, codes = np.unique(np.asarray(product_ids, dtype=object)[valid], return_inverse=True)
+    x = np.log(prices[valid])
+    y = np.log(quantities[valid])
+
+    size = len(unique_ids)
+    sums = np.column_stack([
+        np.bincount(codes, minlength=size),
+        np.bincount(codes, weights=x, minlength=size),
+        np.bincount(codes, weights=y, minlength=size),
+        np.bincount(codes, weights=x * x, minlength=size),
+        np.bincount(codes, weights=x * y, minlength=size),
+        np.bincount(codes, weights=y * y, minlength=size)
+    ])
+    return unique_ids, sums
+
+
+def solve_elasticity(sums: np.ndarray) -> np.ndarray:
+    n, sx, sy, sxx, sxy, syy = sums.T
+    safe_n = np.maximum(n, 1)
+    x_var = np.maximum(sxx - sx * sx / safe_n, 0)
+    xy_cov = sxy - sx * sy / safe_n
+    y_var = np.maximum(syy - sy * sy / safe_n, 0)
+
+    # Too few lines or too little price variation leaves the slope unidentified.
+    identified = (n >= MIN_OBSERVATIONS) & (np.sqrt(x_var / safe_n) >= MIN_LOG_PRICE_STD)
+    slope = np.divide(xy_cov, x_var, out=np.full(len(n), np.nan), where=identified)
+
+    residual = np.maximum(y_var - slope * xy_cov, 0)
+    std_error = np.sqrt(np.divide(
+        residual, (n - 2) * x_var, out=np.full(len(n), np.inf), where=identified
+    ))
+    significant = np.abs(slope) >= MIN_T_STATISTIC * std_error
+
+    return np.where(
+        significant & (slope >= ELASTICITY_BOUNDS[0]) & (slope < ELASTICITY_BOUNDS[1]),
+        slope,
+        np.nan
+    )
+
+
+class ElasticityEstimator:
+    def __init__(self, max_tenants: int = 500):
+        self.max_tenants = max_tenants
+        self._tenants: "OrderedDict[str, Dict]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _state(self, user_id: str) -> Dict:
+        state = self._tenants.get(user_id)
+        if state is None:
+            state = {"index": {}, "sums": np.zeros((0, N_SUMS)), "watermark": None, "recent": {}}
+            self._tenants[user_id] = state
+            while len(self._tenants) > self.max_tenants:
+                evicted, _ = self._tenants.popitem(last=False)
+                self._locks.pop(evicted, None)
+        self._tenants.move_to_end(user_id)
+        return state
+
+    def update(self, user_id: str, sales: List[Dict]) -> None:
+        state = self._state(user_id)
+        # The overlap window returns sales already counted.
+        sales = [sale for sale in sales if sale.get("_id") not in state["recent"]]
+        product_ids, sums = elasticity_sums(sales)
+
+        new_ids = [pid for pid in product_ids if pid not in state["index"]]
+        if new_ids:
+            offset = len(state["index"])
+            state["index"].update({pid: offset + i for i, pid in enumerate(new_ids)})
+            state["sums"] = np.vstack([state["sums"], np.zeros((len(new_ids), N_SUMS))])
+
+        if len(product_ids):
+            rows = np.fromiter((state["index"][pid] for pid in product_ids), dtype=int, count=len(product_ids))
+            state["sums"][rows] += sums
+
+        for sale in sales:
+            if "_id" in sale and sale.get("created_at") is not None:
+                state["recent"][sale["_id"]] = sale["created_at"]
+
+        if state["recent"]:
+            latest = max(state["recent"].values())
+            if state["watermark"] is None or latest > state["watermark"]:
+                state["watermark"] = latest
+            cutoff = state["watermark"] - WATERMARK_OVERLAP
+            state["recent"] = {
+                sale_id: created_at
+                for sale_id, created_at in state["recent"].items()
+                if created_at >= cutoff
+            }
+
+    async def refresh(self, user_id: str) -> None:
+        lock = self._locks.setdefault(user_id, asyncio.Lock())
+        async with lock:
+            state = self._state(user_id)
+            query = {"user_id": ObjectId(user_id)}
+            if state["watermark"] is not None:
+                query["created_at"] = {"$gte": state["watermark"] - WATERMARK_OVERLAP}
+
+            sales = await get_collection("sales").find(
+                query,
+                {"created_at": 1, "items.product_id": 1, "items.unit_price": 1, "items.quantity": 1}
+            ).to_list(length=None)
+
+            self.update(user_id, sales)
+
+    def lookup(self, user_id: str, product_ids: List[str]) -> np.ndarray:
+        state = self._tenants.get(user_id)
+        if state is None or not len(state["index"]):
+            return np.full(len(product_ids), np.nan)
+
+        estimates = solve_elasticity(state["sums"])
+        rows = np.array([state["index"].get(str(pid), -1) for pid in product_ids], dtype=int)
+        return np.where(rows >= 0, estimates[rows], np.nan)
+
+    async def estimate(self, user_id: str, product_ids: List[str]) -> np.ndarray:
+        await self.refresh(user_id)
+        return self.lookup(user_id, product_ids)
+
+
+_default_estimator: Optional[ElasticityEstimator] = None
+
+
+def get_elasticity_estimator() -> ElasticityEstimator:
+    global _default_estimator
+    if _default_estimator is None:
+        _default_estimator = ElasticityEstimator(max_tenants=settings.elasticity_cache_max_tenants)
+    return _default_estimator
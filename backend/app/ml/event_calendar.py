@@ -0,0 +1,55 @@
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+IMPACT_WEIGHTS = {"low": 0.5, "medium": 1.0, "high": 1.5}
+
+
+class EventCalendar:
+    def __init__(self, days: np.ndarray, weights: np.ndarray):
+        self.days = days
+        self.weights = weights
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def _lookup(self, dates) -> Tuple[np.ndarray, np.ndarray]:
+        dates = np.asarray(dates).astype("datetime64[D]")
+        if not len(self.days):
+            return np.zeros(dates.shape, dtype=bool), np.zeros(dates.shape, dtype=int)
+
+        index = np.minimum(np.searchsorted(self.days, dates), len(self.days) - 1)
+        return self.days[index] == dates, index
+
+    def flags(self, dates) -> np.ndarray:
+        matched, _ = self._lookup(dates)
+        return matched.astype(int)
+
+    def impact(self, dates) -> np.ndarray:
+        matched, index = self._lookup(dates)
+        if not len(self.days):
+            return np.zeros(matched.shape)
+        return np.where(matched, self.weights[index], 0.0)
+
+
+@lru_cache(maxsize=64)
+def _compile(key: Tuple[Tuple[str, str], ...]) -> EventCalendar:
+    if not key:
+        return EventCalendar(np.array([], dtype="datetime64[D]"), np.array([]))
+
+    days = np.array([day for day, _ in key], dtype="datetime64[D]")
+    weights = np.array([IMPACT_WEIGHTS.get(level, 1.0) for _, level in key])
+
+    unique_days, starts = np.unique(days, return_index=True)
+    # Several events on one day keep the strongest impact.
+    return EventCalendar(unique_days, np.maximum.reduceat(weights, starts))
+
+
+def compile_event_calendar(events: Optional[List[Dict]]) -> EventCalendar:
+    key = tuple(sorted(
+        (str(event["date"])[:10], event.get("impact_level", "medium"))
+        for event in events or []
+    ))
+    return _compile(key)
@@ -0,0 +1,452 @@
+import asyncio
+import concurrent.futures
+import functools
+import itertools
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.ml.forecaster import get_forecaster, category_key, HIERARCHICAL_MODELS
+from app.ml.timing import FitTimeTracker, WARM_START_METHOD
+
+
+class ForecastQueueFullError(Exception):
+    pass
+
+
+def _forecast_chunk(
+    chunk: List[Tuple[str, Optional[Dict]]],
+    forecast_days: int,
+    events: Optional[List[Dict]],
+    user_id: Optional[str],
+    model: str = "auto",
+    time_budget: Optional[float] = None,
+    fit_times: Optional[FitTimeTracker] = None
+) -> Dict[str, Dict]:
+    forecaster = get_forecaster()
+    started = time.perf_counter()
+    results = {}
+    for product_id, product_series in chunk:
+        remaining = None
+        if time_budget is not None:
+            remaining = max(time_budget - (time.perf_counter() - started), 0.0)
+        results[product_id] = forecaster.forecast_series(
+            product_id=product_id,
+            product_series=product_series,
+            forecast_days=forecast_days,
+            events=events,
+            user_id=user_id,
+            model=model,
+            time_budget=remaining,
+            fit_times=fit_times
+        )
+    return results
+
+
+def _forecast_global(
+    product_ids: List[str],
+    sales_data: List[Dict],
+    forecast_days: int,
+    events: Optional[List[Dict]],
+    user_id: Optional[str]
+) -> Dict[str, Dict]:
+    return get_forecaster().forecast_products_demand(
+        product_ids=product_ids,
+        sales_data=sales_data,
+        forecast_days=forecast_days,
+        events=events,
+        user_id=user_id,
+        model="global"
+    )
+
+
+def _build_series(sales_data: List[Dict], events: Optional[List[Dict]]) -> Dict[str, Dict]:
+    forecaster = get_forecaster()
+    return forecaster.build_daily_series(forecaster.prepare_data(sales_data, events))
+
+
+class ForecastExecutor:
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_queue_depth: int = 32,
+        job_timeout_seconds: float = 120.0,
+        max_tasks_per_child: Optional[int] = 50,
+        chunk_size: int = 8,
+        queue_wait_seconds: float = 10.0
+    ):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue_depth = max_queue_depth
+        self.job_timeout_seconds = job_timeout_seconds
+        self.max_tasks_per_child = max_tasks_per_child
+        self.chunk_size = max(1, chunk_size)
+        self.queue_wait_seconds = queue_wait_seconds
+        self.fit_times = FitTimeTracker()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Recycling workers after max_tasks_per_child requires a non-fork start method.
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                max_tasks_per_child=self.max_tasks_per_child
+            )
+        return self._pool
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_queue_depth)
+        return self._slots
+
+    def _recycle_pool(self, pool: Optional[ProcessPoolExecutor], terminate: bool = False) -> None:
+        # Only the pool that failed is replaced; another request may already
+        # have swapped in a healthy one.
+        if pool is None:
+            return
+        if pool is self._pool:
+            self._pool = None
+        if terminate:
+            # shutdown() never stops a running task, so hung workers are killed.
+            # Every job still on the pool then fails with BrokenProcessPool.
+            for process in list((pool._processes or {}).values()):
+                process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _watch(self, pool: ProcessPoolExecutor, job: concurrent.futures.Future) -> None:
+        if job.done():
+            return
+        if not job.running():
+            # Still queued behind other jobs; check again once it has had a
+            # full timeout on a worker.
+            asyncio.get_running_loop().call_later(self.job_timeout_seconds, self._watch, pool, job)
+            return
+        print(f"Forecast job exceeded {self.job_timeout_seconds}s, recycling the worker pool")
+        self._recycle_pool(pool, terminate=True)
+
+    async def run(self, fn: Callable, *args: Any, timeout: Optional[float] = None) -> Any:
+        slots = self._get_slots()
+        timeout = self.job_timeout_seconds if timeout is None else min(timeout, self.job_timeout_seconds)
+
+        # Waiting for a slot has its own budget; the job timeout only
+        # covers time spent running.
+        try:
+            await asyncio.wait_for(slots.acquire(), timeout=min(timeout, self.queue_wait_seconds))
+        except asyncio.TimeoutError:
+            raise ForecastQueueFullError("Forecast queue is full, try again later")
+
+        loop = asyncio.get_running_loop()
+        try:
+            pool = self._get_pool()
+            try:
+                job = pool.submit(fn, *args)
+            except BrokenProcessPool:
+                self._recycle_pool(pool)
+                pool = self._get_pool()
+                job = pool.submit(fn, *args)
+        except BaseException:
+            slots.release()
+            raise
+
+        # A request that stops waiting leaves the job running, so a shorter
+        # time budget can still warm the model cache. The slot is freed when
+        # the worker is done, and a job past the hard timeout is treated as
+        # hung and its pool recycled.
+        future = asyncio.wrap_future(job)
+        future.add_done_callback(lambda _: slots.release())
+        loop.call_later(self.job_timeout_seconds, self._watch, pool, job)
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout=timeout)
+        except BrokenProcessPool:
+            self._recycle_pool(pool)
+            raise
+
+    async def iter_bounded(self, jobs: List[Callable[[], Awaitable]]) -> AsyncIterator:
+        # A request keeps at most one chunk per worker in flight, so a large
+        # catalog never queues behind its own earlier chunks.
+        window = max(1, min(self.max_workers, self.max_queue_depth))
+        queued = iter(jobs)
+        pending = {asyncio.ensure_future(job()) for job in itertools.islice(queued, window)}
+
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    job = next(queued, None)
+                    if job is not None:
+                        pending.add(asyncio.ensure_future(job()))
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def forecast_product_demand(
+        self,
+        product_id: str,
+        sales_data: List[Dict],
+        forecast_days: int = 30,
+        events: Optional[List[Dict]] = None,
+        user_id: Optional[str] = None,
+        model: str = "auto",
+        time_budget_ms: Optional[int] = None,
+        categories: Optional[Dict[str, str]] = None,
+        tiers: Optional[Dict[str, str]] = None
+    ) -> Dict:
+        results = await self.forecast_products_demand(
+            product_ids=[product_id],
+            sales_data=sales_data,
+            forecast_days=forecast_days,
+            events=events,
+            user_id=user_id,
+            model=model,
+            time_budget_ms=time_budget_ms,
+            categories=categories,
+            tiers=tiers
+        )
+        return results[product_id]
+
+    async def forecast_products_demand(
+        self,
+        product_ids: List[str],
+        sales_data: List[Dict],
+        forecast_days: int = 30,
+        events: Optional[List[Dict]] = None,
+        user_id: Optional[str] = None,
+        model: str = "auto",
+        time_budget_ms: Optional[int] = None,
+        categories: Optional[Dict[str, str]] = None,
+        tiers: Optional[Dict[str, str]] = None
+    ) -> Dict[str, Dict]:
+        results = {}
+        async for batch in self.iter_products_demand(
+            product_ids, sales_data, forecast_days, events, user_id, model, time_budget_ms,
+            categories, tiers
+        ):
+            results.update(batch)
+        return results
+
+    async def iter_products_demand(
+        self,
+        product_ids: List[str],
+        sales_data: List[Dict],
+        forecast_days: int = 30,
+        events: Optional[List[Dict]] = None,
+        user_id: Optional[str] = None,
+        model: str = "auto",
+        time_budget_ms: Optional[int] = None,
+        categories: Optional[Dict[str, str]] = None,
+        tiers: Optional[Dict[str, str]] = None
+    ) -> AsyncIterator[Dict[str, Dict]]:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + time_budget_ms / 1000 if time_budget_ms else None
+
+        if model in HIERARCHICAL_MODELS:
+            yield await self._forecast_hierarchical(
+                product_ids, sales_data, forecast_days, events, user_id, categories or {},
+                model == "hierarchical_reconciled", deadline
+            )
+            return
+
+        if model == "global":
+            # One cross-product fit uses n_jobs threads inside a single worker.
+            try:
+                yield await self.run(
+                    _forecast_global, product_ids, sales_data, forecast_days, events, user_id,
+                    timeout=None if deadline is None else max(deadline - loop.time(), 0.0)
+                )
+                return
+            except ForecastQueueFullError:
+                if deadline is None:
+                    raise
+                model = "auto"
+            except (asyncio.TimeoutError, BrokenProcessPool):
+                model = "auto"
+            except ValueError as e:
+                print(f"Global forecast model failed, forecasting per product: {e}")
+                model = "auto"
+
+        series = await asyncio.to_thread(_build_series, sales_data, events)
+        get_forecaster().assign_tiers(series, tiers)
+
+        if not series:
+            yield {
+                product_id: {
+                    "product_id": product_id,
+                    "forecast": [],
+                    "confidence": "low",
+                    "message": "Insufficient data for forecasting"
+                }
+                for product_id in product_ids
+            }
+            return
+
+        chunks = [
+            [(product_id, series.get(product_id)) for product_id in product_ids[i:i + self.chunk_size]]
+            for i in range(0, len(product_ids), self.chunk_size)
+        ]
+
+        async for batch in self.iter_bounded([
+            functools.partial(self._run_chunk, chunk, forecast_days, events, user_id, model, deadline)
+            for chunk in chunks
+        ]):
+            yield batch
+
+    async def _forecast_hierarchical(
+        self,
+        product_ids: List[str],
+        sales_data: List[Dict],
+        forecast_days: int,
+        events: Optional[List[Dict]],
+        user_id: Optional[str],
+        categories: Dict[str, str],
+        reconcile: bool,
+        deadline: Optional[float]
+    ) -> Dict[str, Dict]:
+        forecaster = get_forecaster()
+        df = await asyncio.to_thread(forecaster.prepare_data, sales_data, events)
+        series = await asyncio.to_thread(forecaster.build_daily_series, df)
+        category_series = await asyncio.to_thread(forecaster.build_category_series, df, categories)
+
+        # Category totals are fitted like products; one fit per category
+        # instead of one per product.
+        category_keys = {category_key(categories.get(pid)) for pid in product_ids}
+        jobs = [(key, category_series.get(key)) for key in sorted(category_keys)]
+        if reconcile:
+            jobs += [
+                (product_id, series[product_id])
+                for product_id in forecaster.reconciled_product_ids(series, categories, category_keys)
+            ]
+
+        results = {}
+        chunks = [jobs[i:i + self.chunk_size] for i in range(0, len(jobs), self.chunk_size)]
+        async for batch in self.iter_bounded([
+            functools.partial(self._run_chunk, chunk, forecast_days, events, user_id, "auto", deadline)
+            for chunk in chunks
+        ]):
+            results.update(batch)
+
+        category_results = {key: results[key] for key in category_keys}
+        product_results = {pid: result for pid, result in results.items() if pid not in category_keys}
+
+        return await asyncio.to_thread(
+            forecaster.disaggregate_forecasts,
+            product_ids, series, categories, category_results, product_results, forecast_days
+        )
+
+    async def _run_chunk(
+        self,
+        chunk: List[Tuple[str, Optional[Dict]]],
+        forecast_days: int,
+        events: Optional[List[Dict]],
+        user_id: Optional[str],
+        model: str,
+        deadline: Optional[float] = None
+    ) -> Dict[str, Dict]:
+        if deadline is None:
+            try:
+                results = await self.run(_forecast_chunk, chunk, forecast_days, events, user_id, model)
+            except ForecastQueueFullError:
+                raise
+            except asyncio.TimeoutError:
+                message = "Using simple average-based forecast: forecast timed out"
+            except Exception as e:
+                message = f"Using simple average-based forecast: {str(e)}"
+            else:
+                self._record_fit_times(chunk, results)
+                return results
+
+            forecaster = get_forecaster()
+            return {
+                product_id: self._fallback(forecaster, product_id, product_series, forecast_days, message)
+                for product_id, product_series in chunk
+            }
+
+        remaining = deadline - asyncio.get_running_loop().time()
+        if remaining > 0:
+            try:
+                results = await self.run(
+                    _forecast_chunk, chunk, forecast_days, events, user_id, model,
+                    remaining, self.fit_times,
+                    timeout=remaining
+                )
+            except Exception:
+                # The worker keeps fitting in the background; a Prophet model it
+                # finishes still lands in the model cache for the next request.
+                pass
+            else:
+                self._record_fit_times(chunk, results)
+                return results
+
+        return await asyncio.to_thread(
+            self._fast_chunk, chunk, forecast_days, "Time budget exceeded, using a faster model"
+        )
+
+    def _record_fit_times(self, chunk: List[Tuple[str, Optional[Dict]]], results: Dict[str, Dict]) -> None:
+        for product_id, product_series in chunk:
+            result = results.get(product_id, {})
+            if product_series is not None and "fit_ms" in result:
+                method = WARM_START_METHOD if result.get("warm_start") else result["model"]
+                self.fit_times.record(
+                    method, len(product_series["daily"]), result["fit_ms"] / 1000
+                )
+
+    @staticmethod
+    def _fast_chunk(
+        chunk: List[Tuple[str, Optional[Dict]]],
+        forecast_days: int,
+        message: str
+    ) -> Dict[str, Dict]:
+        forecaster = get_forecaster()
+        return {
+            product_id: forecaster.fast_forecast(product_id, product_series, forecast_days, message)
+            for product_id, product_series in chunk
+        }
+
+    @staticmethod
+    def _fallback(
+        forecaster,
+        product_id: str,
+        product_series: Optional[Dict],
+        forecast_days: int,
+        message: str
+    ) -> Dict:
+        if product_series is None or product_series["rows"] < 10:
+            return forecaster.forecast_series(product_id, product_series, forecast_days)
+        return forecaster.fallback_forecast(
+            product_id, product_series["daily"], forecast_days, message
+        )
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+
+_default_executor: Optional[ForecastExecutor] = None
+
+
+def get_forecast_executor() -> ForecastExecutor:
+    global _default_executor
+    if _default_executor is None:
+        _default_executor = ForecastExecutor(
+            max_workers=settings.forecast_workers or None,
+            max_queue_depth=settings.forecast_queue_depth,
+            job_timeout_seconds=settings.forecast_job_timeout_seconds,
+            max_tasks_per_child=settings.forecast_worker_max_tasks or None,
+            chunk_size=settings.forecast_chunk_size,
+            queue_wait_seconds=settings.forecast_queue_wait_seconds
+        )
+    return _default_executor
+
+
+def shutdown_forecast_executor() -> None:
+    global _default_executor
+    if _default_executor is not None:
+        _default_executor.shutdown()
+        _default_executor = None
@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional
+
+from app.ml.event_calendar import EventCalendar
+
+
+FEATURE_NAMES = [
+    "horizon",
+    "day_of_week",
+    "event_impact",
+    "last_value",
+    "seasonal_lag",
+    "rolling_mean_7",
+    "rolling_mean_28",
+    "price"
+]
+
+
+def build_panel(
+    df: pd.DataFrame,
+    end_date: pd.Timestamp,
+    calendar: Optional[EventCalendar] = None,
+    horizon: int = 0
+) -> Dict:
+    df = df.assign(ds=df["ds"].dt.normalize())
+    dates = pd.date_range(df["ds"].min(), end_date, freq="D")
+    horizon_dates = pd.date_range(dates[0], periods=len(dates) + horizon, freq="D")
+
+    quantity = df.pivot_table(
+        index="product_id", columns="ds", values="y", aggfunc="sum"
+    ).reindex(columns=dates).fillna(0)
+
+    price = df.pivot_table(
+        index="product_id", columns="ds", values="price", aggfunc="mean"
+    ).reindex(index=quantity.index, columns=dates).ffill(axis=1).bfill(axis=1)
+
+    values = quantity.to_numpy(dtype=float)
+    cumulative = np.zeros((values.shape[0], values.shape[1] + 1))
+    np.cumsum(values, axis=1, out=cumulative[:, 1:])
+
+    if calendar is not None:
+        event_impact = calendar.impact(horizon_dates.values)
+    else:
+        event_impact = np.zeros(len(horizon_dates))
+
+    return {
+        "product_ids": quantity.index.to_numpy(),
+        "dates": dates,
+        "values": values,
+        "cumulative": cumulative,
+        "price": price.fillna(0).to_numpy(dtype=float),
+        "first_sale": np.argmax(values > 0, axis=1),
+        "start_dow": dates[0].dayofweek,
+        "event_impact": event_impact
+    }
+
+
+def _window_mean(cumulative: np.ndarray, rows: np.ndarray, origins: np.ndarray, window: int) -> np.ndarray:
+    lower = np.maximum(origins + 1 - window, 0)
+    return (cumulative[rows, origins + 1] - cumulative[rows, lower]) / (origins + 1 - lower)
+
+
+def origin_features(
+    panel: Dict,
+    rows: np.ndarray,
+    origins: np.ndarray,
+    horizons: np.ndarray
+) -> np.ndarray:
+    targets = origins + horizons
+    seasonal = np.maximum(targets - 7 * np.ceil(horizons / 7).astype(int), 0)
+
+    return np.column_stack([
+        horizons,
+        (panel["start_dow"] + targets) % 7,
+        panel["event_impact"][targets],
+        panel["values"][rows, origins],
+        panel["values"][rows, seasonal],
+        _window_mean(panel["cumulative"], rows, origins, 7),
+        _window_mean(panel["cumulative"], rows, origins, 28),
+        panel["price"][rows, origins]
+    ])
+
+
+def training_matrix(
+    panel: Dict,
+    horizon: int,
+    max_rows: int = 500000,
+    random_state: int = 42
+) -> Dict[str, np.ndarray]:
+    n_products, n_days = panel["values"].shape
+    rng = np.random.default_rng(random_state)
+
+    rows, targets = np.meshgrid(
+        np.arange(n_products), np.arange(horizon, n_days), indexing="ij"
+    )
+    rows, targets = rows.ravel(), targets.ravel()
+
+    # Each (product, day) target is paired with one random lead time, so
+    # the training set stays products x days rather than x horizon.
+    horizons = rng.integers(1, horizon + 1, size=len(rows))
+    origins = targets - horizons
+
+    keep = origins >= panel["first_sale"][rows]
+    rows, origins, horizons, targets = rows[keep], origins[keep], horizons[keep], targets[keep]
+
+    if len(rows) > max_rows:
+        sample = rng.choice(len(rows), size=max_rows, replace=False)
+        rows, origins, horizons, targets = rows[sample], origins[sample], horizons[sample], targets[sample]
+
+    return {
+        "X": origin_features(panel, rows, origins, horizons),
+        "y": panel["values"][rows, targets],
+        "rows": rows
+    }
+
+
+def forecast_matrix(panel: Dict, steps: np.ndarray) -> Dict[str, np.ndarray]:
+    n_products, n_days = panel["values"].shape
+    rows = np.repeat(np.arange(n_products), len(steps))
+    horizons = np.tile(steps, n_products)
+    origins = np.full(len(rows), n_days - 1)
+
+    return {
+        "X": origin_features(panel, rows, origins, horizons),
+        "rows": rows
+    }
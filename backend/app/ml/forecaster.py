@@ -1,17 +1,87 @@
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import List, Dict, Optional, Tuple
-import joblib
+import hashlib
 import os
+import time
 from prophet import Prophet
 from sklearn.ensemble import RandomForestRegressor
 
+from app.config import settings
+from app.ml.model_cache import ModelCache
+from app.ml.features import build_panel, training_matrix, forecast_matrix
+from app.ml.event_calendar import compile_event_calendar
+from app.ml.planning import demand_matrix, plan_reorders
+from app.ml.smoothing import SMOOTHING_METHODS, is_intermittent, smoothing_forecast
+from app.ml.timing import FitTimeTracker
+
+
+HIERARCHICAL_MODELS = ("hierarchical", "hierarchical_reconciled")
+FORECAST_MODELS = ("auto", "prophet", "global") + HIERARCHICAL_MODELS + SMOOTHING_METHODS
+GLOBAL_MODEL_KEY = "__global__"
+CATEGORY_KEY_PREFIX = "category:"
+UNCATEGORIZED = "Uncategorized"
+SHARE_WINDOW_DAYS = 28
+# Fitted Prophet parameters are cached beside each model, under a fixed
+# watermark, so they survive new sales and seed the next fit.
+WARM_START_SUFFIX = ":warm_start"
+
+
+def format_forecast(
+    dates: pd.DatetimeIndex,
+    yhat: np.ndarray,
+    lower: np.ndarray,
+    upper: np.ndarray
+) -> Tuple[List[Dict], float]:
+    # Adding 0.0 turns the -0.0 produced by rounding tiny negatives into 0.0.
+    predicted = np.maximum(np.round(np.asarray(yhat, dtype=float), 2), 0) + 0.0
+    lower = np.maximum(np.round(np.asarray(lower, dtype=float), 2), 0) + 0.0
+    upper = np.maximum(np.round(np.asarray(upper, dtype=float), 2), 0) + 0.0
+    
+    forecast_list = [
+        {
+            "date": date,
+            "predicted_demand": value,
+            "lower_bound": low,
+            "upper_bound": high
+        }
+        for date, value, low, high in zip(
+            pd.DatetimeIndex(dates).strftime("%Y-%m-%d").tolist(),
+            predicted.tolist(),
+            lower.tolist(),
+            upper.tolist()
+        )
+    ]
+    
+    return forecast_list, round(float(predicted.sum()), 2)
+
+
+def category_key(category: Optional[str]) -> str:
+    return CATEGORY_KEY_PREFIX + (category or UNCATEGORIZED)
+
+
+def forecast_to_columnar(result: Dict) -> Dict:
+    forecast = result.get("forecast", [])
+    return {
+        **result,
+        "forecast": {
+            "dates": [f["date"] for f in forecast],
+            "yhat": [f["predicted_demand"] for f in forecast],
+            "lower": [f["lower_bound"] for f in forecast],
+            "upper": [f["upper_bound"] for f in forecast]
+        }
+    }
+
 
 class DemandForecaster:
-    def __init__(self, model_path: str = "../ml_module/models"):
+    def __init__(
+        self,
+        model_path: str = "../ml_module/models",
+        model_cache: Optional[ModelCache] = None
+    ):
         self.model_path = model_path
-        self.prophet_model = None
+        self.model_cache = model_cache
         self.rf_model = None
     
     def prepare_data(
@@ -22,59 +92,458 @@ class DemandForecaster:
         if not sales_data:
             return pd.DataFrame()
         
-        df_list = []
+        columns = {
+            "sale_id": [],
+            "ds": [],
+            "y": [],
+            "product_id": [],
+            "product_name": [],
+            "price": [],
+            "lines": []
+        }
         for sale in sales_data:
-            for item in sale.get("items", []):
-                df_list.append({
-                    "ds": sale["sale_date"],
-                    "y": item["quantity"],
-                    "product_id": item["product_id"],
-                    "product_name": item["product_name"],
-                    "price": item["unit_price"]
-                })
+            if "items" not in sale:
+                # Daily product rollup document (see app.utils.rollups).
+                quantity = sale.get("quantity", 0)
+                columns["sale_id"].append(str(sale.get("last_sale_id", "")))
+                columns["ds"].append(sale["day"])
+                columns["y"].append(quantity)
+                columns["product_id"].append(sale["product_id"])
+                columns["product_name"].append(sale.get("product_name", ""))
+                columns["price"].append(sale.get("revenue", 0) / quantity if quantity else 0)
+                columns["lines"].append(sale.get("order_count", 1))
+                continue
+            
+            sale_id = str(sale.get("_id", ""))
+            for item in sale["items"]:
+                columns["sale_id"].append(sale_id)
+                columns["ds"].append(sale["sale_date"])
+                columns["y"].append(item["quantity"])
+                columns["product_id"].append(item["product_id"])
+                columns["product_name"].append(item["product_name"])
+                columns["price"].append(item["unit_price"])
+                columns["lines"].append(1)
         
-        if not df_list:
+        if not columns["y"]:
             return pd.DataFrame()
         
-        df = pd.DataFrame(df_list)
+        df = pd.DataFrame(columns)
         df["ds"] = pd.to_datetime(df["ds"])
         
-        if events:
-            events_df = pd.DataFrame(events)
-            events_df["date"] = pd.to_datetime(events_df["date"])
-            df = df.merge(
-                events_df[["date", "impact_level"]],
-                left_on="ds",
-                right_on="date",
-                how="left"
-            )
-            df["is_event"] = df["impact_level"].notna().astype(int)
-            df = df.drop(columns=["date", "impact_level"], errors="ignore")
-        else:
-            df["is_event"] = 0
+        calendar = compile_event_calendar(events)
+        days = df["ds"].to_numpy(dtype="datetime64[D]")
+        df["is_event"] = calendar.flags(days)
+        df["event_impact"] = calendar.impact(days)
         
         return df
     
+    def build_daily_series(self, df: pd.DataFrame) -> Dict[str, Dict]:
+        if df.empty:
+            return {}
+        
+        df = df.assign(ds=df["ds"].dt.normalize())
+        
+        stats = df.groupby("product_id", sort=False).agg(
+            rows=("lines", "sum"),
+            last_sale_id=("sale_id", "max"),
+            last_ds=("ds", "max"),
+            total_y=("y", "sum"),
+            event_rows=("is_event", "sum")
+        )
+        
+        daily = df.groupby(["product_id", "ds"], sort=True).agg(
+            y=("y", "sum"),
+            is_event=("is_event", "max")
+        ).reset_index()
+        
+        series = {}
+        for product_id, group in daily.groupby("product_id", sort=False):
+            product_stats = stats.loc[product_id]
+            series[product_id] = {
+                "daily": group[["ds", "y", "is_event"]].reset_index(drop=True),
+                "rows": int(product_stats["rows"]),
+                "watermark": self.sales_watermark(product_stats)
+            }
+        
+        return series
+    
     def forecast_product_demand(
         self,
         product_id: str,
         sales_data: List[Dict],
         forecast_days: int = 30,
-        events: Optional[List[Dict]] = None
+        events: Optional[List[Dict]] = None,
+        user_id: Optional[str] = None,
+        model: str = "auto",
+        categories: Optional[Dict[str, str]] = None,
+        tiers: Optional[Dict[str, str]] = None
     ) -> Dict:
+        return self.forecast_products_demand(
+            product_ids=[product_id],
+            sales_data=sales_data,
+            forecast_days=forecast_days,
+            events=events,
+            user_id=user_id,
+            model=model,
+            categories=categories,
+            tiers=tiers
+        )[product_id]
+    
+    def forecast_products_demand(
+        self,
+        product_ids: List[str],
+        sales_data: List[Dict],
+        forecast_days: int = 30,
+        events: Optional[List[Dict]] = None,
+        user_id: Optional[str] = None,
+        model: str = "auto",
+        categories: Optional[Dict[str, str]] = None,
+        tiers: Optional[Dict[str, str]] = None
+    ) -> Dict[str, Dict]:
         df = self.prepare_data(sales_data, events)
         
         if df.empty:
             return {
+                product_id: {
+                    "product_id": product_id,
+                    "forecast": [],
+                    "confidence": "low",
+                    "message": "Insufficient data for forecasting"
+                }
+                for product_id in product_ids
+            }
+        
+        series = self.build_daily_series(df)
+        self.assign_tiers(series, tiers)
+        
+        if model in HIERARCHICAL_MODELS:
+            return self.forecast_products_hierarchical(
+                product_ids, df, series, categories or {}, forecast_days, events, user_id,
+                reconcile=model == "hierarchical_reconciled"
+            )
+        
+        if model == "global":
+            results = self.forecast_products_global(
+                product_ids, df, series, forecast_days, events, user_id
+            )
+            if results is not None:
+                return results
+            model = "auto"
+        
+        return {
+            product_id: self.forecast_series(
+                product_id=product_id,
+                product_series=series.get(product_id),
+                forecast_days=forecast_days,
+                events=events,
+                user_id=user_id,
+                model=model
+            )
+            for product_id in product_ids
+        }
+    
+    def fit_global_model(self, panel: Dict, horizon: int) -> Dict:
+        training = training_matrix(
+            panel,
+            horizon,
+            max_rows=settings.global_model_max_rows
+        )
+        
+        model = RandomForestRegressor(
+            n_estimators=settings.global_model_trees,
+            min_samples_leaf=5,
+            max_features=0.6,
+            oob_score=True,
+            n_jobs=settings.global_model_n_jobs,
+            random_state=42
+        )
+        model.fit(training["X"], training["y"])
+        
+        n_products = len(panel["product_ids"])
+        residuals = (training["y"] - model.oob_prediction_) ** 2
+        counts = np.bincount(training["rows"], minlength=n_products)
+        sums = np.bincount(training["rows"], weights=residuals, minlength=n_products)
+        overall_sigma = float(np.sqrt(residuals.mean()))
+        sigma = np.where(counts > 0, np.sqrt(sums / np.maximum(counts, 1)), overall_sigma)
+        
+        return {
+            "model": model,
+            "horizon": horizon,
+            "sigma": dict(zip(panel["product_ids"], sigma)),
+            "overall_sigma": overall_sigma
+        }
+    
+    def forecast_products_global(
+        self,
+        product_ids: List[str],
+        df: pd.DataFrame,
+        series: Dict[str, Dict],
+        forecast_days: int = 30,
+        events: Optional[List[Dict]] = None,
+        user_id: Optional[str] = None
+    ) -> Optional[Dict[str, Dict]]:
+        today = pd.Timestamp(datetime.utcnow().date())
+        yesterday = today - pd.Timedelta(days=1)
+        end_date = max(df["ds"].max().normalize(), yesterday)
+        dates = today + pd.to_timedelta(np.arange(1, forecast_days + 1), unit="D")
+        steps = np.maximum((dates - end_date).days.to_numpy(), 1)
+        horizon = int(steps.max())
+        
+        panel = build_panel(df, end_date, compile_event_calendar(events), horizon=horizon)
+        
+        # Train for the configured horizon when history allows, so the cached
+        # model serves longer requests too; otherwise only as far as asked.
+        train_horizon = max(horizon, settings.global_model_horizon)
+        if len(panel["dates"]) < train_horizon + 28:
+            train_horizon = horizon
+        if len(panel["dates"]) < train_horizon + 28:
+            return None
+        
+        watermark = hashlib.sha1("|".join(
+            sorted(f"{pid}={product_series['watermark']}" for pid, product_series in series.items())
+        ).encode("utf-8")).hexdigest()
+        
+        bundle = None
+        use_cache = self.model_cache is not None and user_id is not None
+        if use_cache:
+            bundle = self.model_cache.get(user_id, GLOBAL_MODEL_KEY, watermark)
+            if bundle is not None and bundle["horizon"] < horizon:
+                bundle = None
+        
+        if bundle is None:
+            bundle = self.fit_global_model(panel, train_horizon)
+            if use_cache:
+                self.model_cache.put(user_id, GLOBAL_MODEL_KEY, watermark, bundle)
+        
+        self.rf_model = bundle["model"]
+        
+        matrix = forecast_matrix(panel, steps)
+        predictions = np.maximum(self.rf_model.predict(matrix["X"]), 0).reshape(-1, len(steps))
+        
+        row_index = {pid: i for i, pid in enumerate(panel["product_ids"])}
+        results = {}
+        
+        for product_id in product_ids:
+            product_series = series.get(product_id)
+            if product_series is None or product_id not in row_index:
+                results[product_id] = self.forecast_series(product_id, None, forecast_days)
+                continue
+            
+            yhat = predictions[row_index[product_id]]
+            spread = 1.2816 * bundle["sigma"].get(product_id, bundle["overall_sigma"])
+            forecast_list, total_predicted = format_forecast(
+                dates, yhat, yhat - spread, yhat + spread
+            )
+            
+            rows = product_series["rows"]
+            results[product_id] = {
                 "product_id": product_id,
-                "forecast": [],
-                "confidence": "low",
-                "message": "Insufficient data for forecasting"
+                "forecast": forecast_list,
+                "total_predicted_demand": total_predicted,
+                "confidence": "high" if rows >= 50 else "medium" if rows >= 10 else "low",
+                "historical_average": round(product_series["daily"]["y"].mean(), 2),
+                "model": "global",
+                "message": "Forecast generated successfully"
+            }
+        
+        return results
+    
+    @staticmethod
+    def assign_tiers(series: Dict[str, Dict], tiers: Optional[Dict[str, str]]) -> None:
+        for product_id, tier in (tiers or {}).items():
+            if product_id in series:
+                series[product_id]["tier"] = tier
+    
+    def build_category_series(self, df: pd.DataFrame, categories: Dict[str, str]) -> Dict[str, Dict]:
+        # Sales of products outside `categories` (inactive or moved elsewhere)
+        # belong to no parent series.
+        df = df[df["product_id"].isin(list(categories))]
+        if df.empty:
+            return {}
+        
+        keys = df["product_id"].map({
+            product_id: category_key(categories.get(product_id))
+            for product_id in df["product_id"].unique()
+        })
+        return self.build_daily_series(df.assign(product_id=keys))
+    
+    def reconciled_product_ids(
+        self,
+        series: Dict[str, Dict],
+        categories: Dict[str, str],
+        category_keys: set
+    ) -> List[str]:
+        return [
+            product_id
+            for product_id, product_series in series.items()
+            if category_key(categories.get(product_id)) in category_keys
+            and product_series["rows"] >= settings.min_data_points_for_forecast
+        ]
+    
+    def forecast_products_hierarchical(
+        self,
+        product_ids: List[str],
+        df: pd.DataFrame,
+        series: Dict[str, Dict],
+        categories: Dict[str, str],
+        forecast_days: int = 30,
+        events: Optional[List[Dict]] = None,
+        user_id: Optional[str] = None,
+        reconcile: bool = False
+    ) -> Dict[str, Dict]:
+        category_series = self.build_category_series(df, categories)
+        category_keys = {category_key(categories.get(pid)) for pid in product_ids}
+        
+        category_results = {
+            key: self.forecast_series(key, category_series.get(key), forecast_days, events, user_id)
+            for key in category_keys
+        }
+        
+        product_results = {}
+        if reconcile:
+            product_results = {
+                product_id: self.forecast_series(
+                    product_id, series[product_id], forecast_days, events, user_id
+                )
+                for product_id in self.reconciled_product_ids(series, categories, category_keys)
             }
         
-        product_df = df[df["product_id"] == product_id].copy()
+        return self.disaggregate_forecasts(
+            product_ids, series, categories, category_results, product_results, forecast_days
+        )
+    
+    @staticmethod
+    def sales_shares(series: Dict[str, Dict], members: List[str]) -> Dict[str, float]:
+        last_day = max(series[pid]["daily"]["ds"].max() for pid in members)
+        window_start = last_day - pd.Timedelta(days=SHARE_WINDOW_DAYS)
         
-        if len(product_df) < 10:
+        recent = np.array([
+            series[pid]["daily"].loc[series[pid]["daily"]["ds"] > window_start, "y"].sum()
+            for pid in members
+        ], dtype=float)
+        if recent.sum() <= 0:
+            recent = np.array([series[pid]["daily"]["y"].sum() for pid in members], dtype=float)
+        
+        total = recent.sum()
+        shares = recent / total if total > 0 else np.full(len(members), 1 / len(members))
+        return dict(zip(members, shares.tolist()))
+    
+    def disaggregate_forecasts(
+        self,
+        product_ids: List[str],
+        series: Dict[str, Dict],
+        categories: Dict[str, str],
+        category_results: Dict[str, Dict],
+        product_results: Optional[Dict[str, Dict]] = None,
+        forecast_days: int = 30
+    ) -> Dict[str, Dict]:
+        product_results = product_results or {}
+        
+        members: Dict[str, List[str]] = {}
+        for product_id in series:
+            if product_id in categories:
+                members.setdefault(category_key(categories[product_id]), []).append(product_id)
+        
+        allocations: Dict[str, Dict] = {}
+        results = {}
+        
+        for product_id in product_ids:
+            key = category_key(categories.get(product_id))
+            top = category_results.get(key) or {}
+            
+            if product_id not in series or product_id not in categories or not top.get("forecast"):
+                results[product_id] = self.forecast_series(product_id, None, forecast_days)
+                continue
+            
+            if key not in allocations:
+                allocations[key] = self.allocate_category(top, series, members[key], product_results)
+            
+            allocation = allocations[key]
+            yhat, lower, upper = allocation["forecasts"][product_id]
+            forecast_list, total_predicted = format_forecast(allocation["dates"], yhat, lower, upper)
+            
+            product_series = series[product_id]
+            own = product_results.get(product_id) or {}
+            if own.get("forecast"):
+                confidence = own["confidence"]
+            else:
+                confidence = top["confidence"] if product_series["rows"] >= 10 else "low"
+            
+            results[product_id] = {
+                "product_id": product_id,
+                "forecast": forecast_list,
+                "total_predicted_demand": total_predicted,
+                "confidence": confidence,
+                "historical_average": round(product_series["daily"]["y"].mean(), 2),
+                "model": "hierarchical",
+                "category_model": top.get("model"),
+                "sales_share": round(allocation["shares"][product_id], 4),
+                "reconciled": bool(own.get("forecast")),
+                "message": f"Forecast disaggregated from category {key[len(CATEGORY_KEY_PREFIX):]}"
+            }
+            if "degraded" in top:
+                results[product_id]["degraded"] = top["degraded"]
+        
+        return results
+    
+    def allocate_category(
+        self,
+        top: Dict,
+        series: Dict[str, Dict],
+        members: List[str],
+        product_results: Dict[str, Dict]
+    ) -> Dict:
+        dates = [f["date"] for f in top["forecast"]]
+        top_yhat = np.array([f["predicted_demand"] for f in top["forecast"]])
+        top_lower = np.array([f["lower_bound"] for f in top["forecast"]])
+        top_upper = np.array([f["upper_bound"] for f in top["forecast"]])
+        
+        shares = self.sales_shares(series, members)
+        share_column = np.array([shares[pid] for pid in members])[:, None]
+        
+        # Top-down split by recent sales share; products with their own model
+        # replace their slice and the level is rescaled to the category total.
+        yhat = share_column * top_yhat
+        lower = share_column * top_lower
+        upper = share_column * top_upper
+        
+        for i, product_id in enumerate(members):
+            own = product_results.get(product_id) or {}
+            if not own.get("forecast"):
+                continue
+            by_date = {f["date"]: f for f in own["forecast"]}
+            for j, date in enumerate(dates):
+                if date in by_date:
+                    yhat[i, j] = by_date[date]["predicted_demand"]
+                    lower[i, j] = by_date[date]["lower_bound"]
+                    upper[i, j] = by_date[date]["upper_bound"]
+        
+        if product_results:
+            level = yhat.sum(axis=0)
+            scale = np.divide(top_yhat, level, out=np.ones_like(top_yhat), where=level > 0)
+            yhat, lower, upper = yhat * scale, lower * scale, upper * scale
+        
+        return {
+            "dates": dates,
+            "shares": shares,
+            "forecasts": {
+                product_id: (yhat[i], lower[i], upper[i])
+                for i, product_id in enumerate(members)
+            }
+        }
+    
+    def forecast_series(
+        self,
+        product_id: str,
+        product_series: Optional[Dict],
+        forecast_days: int = 30,
+        events: Optional[List[Dict]] = None,
+        user_id: Optional[str] = None,
+        model: str = "auto",
+        time_budget: Optional[float] = None,
+        fit_times: Optional[FitTimeTracker] = None
+    ) -> Dict:
+        if product_series is None or product_series["rows"] < 10:
             return {
                 "product_id": product_id,
                 "forecast": [],
@@ -82,81 +551,301 @@ class DemandForecaster:
                 "message": "Insufficient sales history for this product"
             }
         
-        daily_sales = product_df.groupby("ds").agg({
-            "y": "sum",
-            "is_event": "max"
-        }).reset_index()
+        tier = product_series.get("tier") if model == "auto" else None
+        if tier == "dead":
+            return {
+                "product_id": product_id,
+                "forecast": [],
+                "confidence": "low",
+                "tier": tier,
+                "message": "No sales in the segmentation window, forecast skipped"
+            }
+        
+        daily_sales = product_series["daily"]
+        values, end_date = self.daily_values(daily_sales)
+        
+        if model == "prophet" or tier == "full":
+            method = "prophet"
+        elif model == "auto":
+            method = self.select_model(values)
+            if tier == "cheap" and method not in SMOOTHING_METHODS:
+                method = "holt_winters"
+        else:
+            method = model
+        
+        preferred = method
+        if time_budget is not None:
+            method = self.budgeted_model(
+                method, product_id, product_series, time_budget, user_id, fit_times
+            )
+        
+        if method in SMOOTHING_METHODS:
+            result = self.smoothing_forecast_result(
+                product_id, product_series, values, end_date, forecast_days, method
+            )
+        else:
+            result = self.prophet_forecast_result(
+                product_id, product_series, forecast_days, events, user_id
+            )
+        
+        if time_budget is not None:
+            result["degraded"] = result.get("model") != preferred
+        if tier is not None:
+            result["tier"] = tier
+        return result
+    
+    def budgeted_model(
+        self,
+        method: str,
+        product_id: str,
+        product_series: Dict,
+        time_budget: float,
+        user_id: Optional[str] = None,
+        fit_times: Optional[FitTimeTracker] = None
+    ) -> str:
+        warm_start = False
+        if method == "prophet" and self.model_cache is not None and user_id is not None:
+            # A cached Prophet model only needs predict(), which fits any budget.
+            if self.model_cache.get(user_id, product_id, product_series["watermark"]) is not None:
+                return method
+            warm_start = self.warm_start_params(user_id, product_id) is not None
+        
+        return (fit_times or FitTimeTracker()).choose(
+            method, len(product_series["daily"]), time_budget, warm_start
+        )
+    
+    def fast_forecast(
+        self,
+        product_id: str,
+        product_series: Optional[Dict],
+        forecast_days: int,
+        message: str
+    ) -> Dict:
+        if product_series is None or product_series["rows"] < 10:
+            return self.forecast_series(product_id, product_series, forecast_days)
         
         try:
-            model = Prophet(
-                daily_seasonality=False,
-                weekly_seasonality=True,
-                yearly_seasonality=True,
-                changepoint_prior_scale=0.05
+            values, end_date = self.daily_values(product_series["daily"])
+            method = "sba" if is_intermittent(values) else "ses"
+            result = self.smoothing_forecast_result(
+                product_id, product_series, values, end_date, forecast_days, method
             )
+        except Exception:
+            result = self.fallback_forecast(
+                product_id, product_series["daily"], forecast_days, message
+            )
+        
+        result["message"] = message
+        result["degraded"] = True
+        return result
+    
+    def select_model(self, values: np.ndarray, season_length: int = 7) -> str:
+        if is_intermittent(values):
+            return "sba"
+        if len(values) < 2 * season_length:
+            return "ses"
+        if len(values) < settings.short_history_days:
+            return "holt_winters"
+        return "prophet"
+    
+    @staticmethod
+    def daily_values(daily_sales: pd.DataFrame) -> Tuple[np.ndarray, pd.Timestamp]:
+        series = daily_sales.set_index("ds")["y"]
+        yesterday = pd.Timestamp(datetime.utcnow().date()) - pd.Timedelta(days=1)
+        end_date = max(series.index.max(), yesterday)
+        values = series.reindex(
+            pd.date_range(series.index.min(), end_date, freq="D"),
+            fill_value=0
+        ).to_numpy(dtype=float)
+        return values, end_date
+    
+    def smoothing_forecast_result(
+        self,
+        product_id: str,
+        product_series: Dict,
+        values: np.ndarray,
+        end_date: pd.Timestamp,
+        forecast_days: int,
+        method: str
+    ) -> Dict:
+        today = pd.Timestamp(datetime.utcnow().date())
+        dates = today + pd.to_timedelta(np.arange(1, forecast_days + 1), unit="D")
+        steps = np.maximum((dates - end_date).days.to_numpy(), 1)
+        
+        started = time.perf_counter()
+        result = smoothing_forecast(values, steps, method)
+        fit_seconds = time.perf_counter() - started
+        
+        forecast_list, total_predicted = format_forecast(
+            dates, result["yhat"], result["lower"], result["upper"]
+        )
+        confidence = "high" if product_series["rows"] >= 50 else "medium"
+        
+        return {
+            "product_id": product_id,
+            "forecast": forecast_list,
+            "total_predicted_demand": total_predicted,
+            "confidence": confidence,
+            "historical_average": round(product_series["daily"]["y"].mean(), 2),
+            "model": method,
+            "fit_ms": round(fit_seconds * 1000, 1),
+            "message": "Forecast generated successfully"
+        }
+    
+    def prophet_forecast_result(
+        self,
+        product_id: str,
+        product_series: Dict,
+        forecast_days: int = 30,
+        events: Optional[List[Dict]] = None,
+        user_id: Optional[str] = None
+    ) -> Dict:
+        daily_sales = product_series["daily"]
+        
+        try:
+            model = None
+            fit_seconds = None
+            watermark = product_series["watermark"]
+            use_cache = self.model_cache is not None and user_id is not None
             
-            if "is_event" in daily_sales.columns:
-                model.add_regressor("is_event")
-            
-            model.fit(daily_sales[["ds", "y", "is_event"]])
-            
-            future = model.make_future_dataframe(periods=forecast_days)
-            future["is_event"] = 0
-            
-            if events:
-                future_events = [
-                    e for e in events
-                    if datetime.fromisoformat(str(e["date"])) > datetime.utcnow()
-                ]
-                for event in future_events:
-                    event_date = pd.to_datetime(event["date"])
-                    future.loc[future["ds"] == event_date, "is_event"] = 1
+            if use_cache:
+                model = self.model_cache.get(user_id, product_id, watermark)
             
-            forecast = model.predict(future)
+            if model is None:
+                warm_params = self.warm_start_params(user_id, product_id) if use_cache else None
+                
+                started = time.perf_counter()
+                model, warm_start = self.fit_prophet(daily_sales, warm_params)
+                fit_seconds = time.perf_counter() - started
+                
+                if use_cache:
+                    self.model_cache.put(user_id, product_id, watermark, model)
+                    self.model_cache.put(
+                        user_id, product_id + WARM_START_SUFFIX, WARM_START_SUFFIX,
+                        self.prophet_params(model)
+                    )
             
-            future_forecast = forecast[forecast["ds"] > datetime.utcnow()].copy()
+            # Exactly forecast_days days from tomorrow, the same dates the
+            # smoothing models return, whatever day the history ends on.
+            today = pd.Timestamp(datetime.utcnow().date())
+            future = pd.DataFrame({
+                "ds": today + pd.to_timedelta(np.arange(1, forecast_days + 1), unit="D")
+            })
+            future["is_event"] = compile_event_calendar(events).flags(
+                future["ds"].to_numpy(dtype="datetime64[D]")
+            )
             
-            forecast_list = []
-            for _, row in future_forecast.iterrows():
-                forecast_list.append({
-                    "date": row["ds"].strftime("%Y-%m-%d"),
-                    "predicted_demand": max(0, round(row["yhat"], 2)),
-                    "lower_bound": max(0, round(row["yhat_lower"], 2)),
-                    "upper_bound": max(0, round(row["yhat_upper"], 2))
-                })
+            future_forecast = model.predict(future)
             
-            total_predicted = sum(f["predicted_demand"] for f in forecast_list)
-            confidence = "high" if len(product_df) >= 50 else "medium"
+            forecast_list, total_predicted = format_forecast(
+                future_forecast["ds"],
+                future_forecast["yhat"].to_numpy(),
+                future_forecast["yhat_lower"].to_numpy(),
+                future_forecast["yhat_upper"].to_numpy()
+            )
+            confidence = "high" if product_series["rows"] >= 50 else "medium"
             
-            return {
+            result = {
                 "product_id": product_id,
                 "forecast": forecast_list,
-                "total_predicted_demand": round(total_predicted, 2),
+                "total_predicted_demand": total_predicted,
                 "confidence": confidence,
                 "historical_average": round(daily_sales["y"].mean(), 2),
+                "model": "prophet",
                 "message": "Forecast generated successfully"
             }
+            if fit_seconds is not None:
+                result["fit_ms"] = round(fit_seconds * 1000, 1)
+                result["warm_start"] = warm_start
+            return result
         
         except Exception as e:
-            avg_demand = daily_sales["y"].mean()
-            simple_forecast = [
-                {
-                    "date": (datetime.utcnow() + timedelta(days=i)).strftime("%Y-%m-%d"),
-                    "predicted_demand": round(avg_demand, 2),
-                    "lower_bound": round(avg_demand * 0.7, 2),
-                    "upper_bound": round(avg_demand * 1.3, 2)
-                }
-                for i in range(1, forecast_days + 1)
-            ]
-            
-            return {
-                "product_id": product_id,
-                "forecast": simple_forecast,
-                "total_predicted_demand": round(avg_demand * forecast_days, 2),
-                "confidence": "low",
-                "historical_average": round(avg_demand, 2),
-                "message": f"Using simple average-based forecast: {str(e)}"
-            }
+            return self.fallback_forecast(
+                product_id,
+                daily_sales,
+                forecast_days,
+                f"Using simple average-based forecast: {str(e)}"
+            )
+    
+    @staticmethod
+    def new_prophet(daily_sales: pd.DataFrame) -> Prophet:
+        model = Prophet(
+            daily_seasonality=False,
+            weekly_seasonality=True,
+            yearly_seasonality=True,
+            changepoint_prior_scale=0.05
+        )
+        
+        if "is_event" in daily_sales.columns:
+            model.add_regressor("is_event")
+        
+        return model
+    
+    def fit_prophet(
+        self,
+        daily_sales: pd.DataFrame,
+        warm_params: Optional[Dict] = None
+    ) -> Tuple[Prophet, bool]:
+        history = daily_sales[["ds", "y", "is_event"]]
+        
+        if warm_params is not None:
+            try:
+                return self.new_prophet(daily_sales).fit(history, init=warm_params), True
+            except Exception:
+                # Refit from scratch; the result reports warm_start False.
+                pass
+        
+        return self.new_prophet(daily_sales).fit(history), False
+    
+    def warm_start_params(self, user_id: str, product_id: str) -> Optional[Dict]:
+        return self.model_cache.get(user_id, product_id + WARM_START_SUFFIX, WARM_START_SUFFIX)
+    
+    @staticmethod
+    def prophet_params(model: Prophet) -> Dict:
+        return {
+            "k": float(model.params["k"][0][0]),
+            "m": float(model.params["m"][0][0]),
+            "sigma_obs": float(model.params["sigma_obs"][0][0]),
+            "delta": np.asarray(model.params["delta"][0], dtype=float),
+            "beta": np.asarray(model.params["beta"][0], dtype=float)
+        }
+    
+    def fallback_forecast(
+        self,
+        product_id: str,
+        daily_sales: pd.DataFrame,
+        forecast_days: int,
+        message: str
+    ) -> Dict:
+        avg_demand = daily_sales["y"].mean()
+        today = pd.Timestamp(datetime.utcnow().date())
+        baseline = np.full(forecast_days, avg_demand)
+        simple_forecast, _ = format_forecast(
+            today + pd.to_timedelta(np.arange(1, forecast_days + 1), unit="D"),
+            baseline,
+            baseline * 0.7,
+            baseline * 1.3
+        )
+        
+        return {
+            "product_id": product_id,
+            "forecast": simple_forecast,
+            "total_predicted_demand": round(avg_demand * forecast_days, 2),
+            "confidence": "low",
+            "historical_average": round(avg_demand, 2),
+            "model": "mean",
+            "message": message
+        }
+    
+    @staticmethod
+    def sales_watermark(product_stats: pd.Series) -> str:
+        return ":".join([
+            str(product_stats["last_sale_id"]),
+            product_stats["last_ds"].isoformat(),
+            str(int(product_stats["rows"])),
+            str(round(float(product_stats["total_y"]), 4)),
+            str(int(product_stats["event_rows"]))
+        ])
     
     def calculate_reorder_point(
         self,
@@ -171,42 +860,57 @@ class DemandForecaster:
                 "message": "Insufficient data"
             }
         
-        lead_time_forecast = forecast_data["forecast"][:lead_time_days]
-        lead_time_demand = sum(f["predicted_demand"] for f in lead_time_forecast)
-        
-        demand_values = [f["predicted_demand"] for f in lead_time_forecast]
-        demand_std = np.std(demand_values) if len(demand_values) > 1 else lead_time_demand * 0.2
-        
-        z_score = 1.65 if service_level >= 0.95 else 1.28
-        safety_stock = z_score * demand_std * np.sqrt(lead_time_days)
-        
-        reorder_point = lead_time_demand + safety_stock
+        plan = plan_reorders(
+            demand_matrix([forecast_data], lead_time_days),
+            lead_time_days,
+            service_level,
+            0
+        )
         
         return {
-            "reorder_point": max(1, round(reorder_point)),
-            "safety_stock": max(0, round(safety_stock)),
-            "lead_time_demand": round(lead_time_demand, 2),
+            "reorder_point": int(plan["reorder_point"][0]),
+            "safety_stock": int(plan["safety_stock"][0]),
+            "lead_time_demand": float(plan["lead_time_demand"][0]),
             "lead_time_days": lead_time_days,
             "service_level": service_level,
             "message": "Reorder point calculated successfully"
         }
     
+    def demand_statistics(self, sales_data: List[Dict]) -> pd.DataFrame:
+        df = self.prepare_data(sales_data)
+        if df.empty:
+            return pd.DataFrame(columns=["quantity", "lines", "avg_quantity"], dtype=float)
+        
+        stats = df.groupby("product_id", sort=False).agg(
+            quantity=("y", "sum"),
+            lines=("lines", "sum")
+        ).astype(float)
+        stats["avg_quantity"] = stats["quantity"] / stats["lines"]
+        return stats
+    
     def optimize_pricing(
         self,
         product_data: Dict,
         sales_data: List[Dict],
-        market_data: Optional[Dict] = None
+        market_data: Optional[Dict] = None,
+        price_elasticity: Optional[float] = None
     ) -> Dict:
-        cost_price = product_data.get("cost_price", 0)
-        current_price = product_data.get("selling_price", 0)
+        elasticities = None if price_elasticity is None else np.array([price_elasticity], dtype=float)
+        return self.optimize_pricing_batch([product_data], sales_data, market_data, elasticities)[0]
+    
+    def optimize_pricing_batch(
+        self,
+        products: List[Dict],
+        sales_data: List[Dict],
+        market_data: Optional[Dict] = None,
+        elasticities: Optional[np.ndarray] = None
+    ) -> List[Dict]:
+        if not products:
+            return []
         
-        if cost_price == 0:
-            return {
-                "recommended_price": current_price,
-                "min_price": current_price,
-                "max_price": current_price,
-                "message": "Cost price not available"
-            }
+        cost_price = np.array([p.get("cost_price") or 0 for p in products], dtype=float)
+        current_price = np.array([p.get("selling_price") or 0 for p in products], dtype=float)
+        product_ids = [str(p.get("_id") or p.get("id") or "") for p in products]
         
         min_markup = 1.15
         target_markup = 1.40
@@ -216,37 +920,93 @@ class DemandForecaster:
         recommended_price = cost_price * target_markup
         max_price = cost_price * max_markup
         
-        product_id = product_data.get("_id") or product_data.get("id")
-        if product_id and sales_data:
-            df = self.prepare_data(sales_data)
-            product_sales = df[df["product_id"] == str(product_id)]
-            
-            if not product_sales.empty:
-                avg_quantity = product_sales["y"].mean()
-                price_elasticity = -1.5
-                
-                if avg_quantity < 5:
-                    recommended_price *= 0.95
-                elif avg_quantity > 20:
-                    recommended_price *= 1.05
+        # NaN for products without sales, so neither demand rule applies.
+        avg_quantity = self.demand_statistics(sales_data)["avg_quantity"].reindex(product_ids).to_numpy()
+        
+        recommended_price = np.where(avg_quantity < 5, recommended_price * 0.95, recommended_price)
+        recommended_price = np.where(avg_quantity > 20, recommended_price * 1.05, recommended_price)
+        
+        if elasticities is None:
+            elasticities = np.full(len(products), np.nan)
+        elasticities = np.asarray(elasticities, dtype=float)
+        
+        # Profit-maximizing markup under constant elasticity e is e / (1 + e);
+        # inelastic demand (e >= -1) has no interior optimum and ends at max_price.
+        elastic = elasticities < -1
+        optimal_markup = np.divide(
+            elasticities, 1 + elasticities,
+            out=np.full(len(products), max_markup), where=elastic
+        )
+        recommended_price = np.where(
+            np.isnan(elasticities), recommended_price, cost_price * optimal_markup
+        )
         
         if market_data and market_data.get("competitor_prices"):
             competitor_avg = np.mean(market_data["competitor_prices"])
             if competitor_avg > 0:
-                recommended_price = min(recommended_price, competitor_avg * 0.98)
+                recommended_price = np.minimum(recommended_price, competitor_avg * 0.98)
         
-        recommended_price = max(min_price, min(recommended_price, max_price))
+        recommended_price = np.clip(recommended_price, min_price, max_price)
         
-        expected_margin = ((recommended_price - cost_price) / recommended_price) * 100
+        expected_margin = np.divide(
+            (recommended_price - cost_price) * 100, recommended_price,
+            out=np.zeros_like(recommended_price), where=recommended_price > 0
+        )
+        price_change = np.divide(
+            (recommended_price - current_price) * 100, current_price,
+            out=np.zeros_like(recommended_price), where=current_price > 0
+        )
         
-        return {
-            "recommended_price": round(recommended_price, 2),
-            "min_price": round(min_price, 2),
-            "max_price": round(max_price, 2),
-            "current_price": current_price,
-            "expected_margin_percent": round(expected_margin, 2),
-            "price_change_percent": round(
-                ((recommended_price - current_price) / current_price) * 100, 2
-            ) if current_price > 0 else 0,
-            "message": "Pricing optimized based on cost and demand"
-        }
+        columns = zip(
+            products,
+            cost_price.tolist(),
+            np.round(recommended_price, 2).tolist(),
+            np.round(min_price, 2).tolist(),
+            np.round(max_price, 2).tolist(),
+            np.round(expected_margin, 2).tolist(),
+            np.round(price_change, 2).tolist(),
+            np.round(elasticities, 3).tolist()
+        )
+        
+        results = []
+        for product, cost, recommended, low, high, margin, change, elasticity in columns:
+            current = product.get("selling_price", 0)
+            if cost == 0:
+                results.append({
+                    "recommended_price": current,
+                    "min_price": current,
+                    "max_price": current,
+                    "message": "Cost price not available"
+                })
+                continue
+            
+            results.append({
+                "recommended_price": recommended,
+                "min_price": low,
+                "max_price": high,
+                "current_price": current,
+                "expected_margin_percent": margin,
+                "price_change_percent": change,
+                "price_elasticity": None if np.isnan(elasticity) else elasticity,
+                "message": "Pricing optimized based on cost and demand"
+            })
+        
+        return results
+
+
+_default_forecaster: Optional[DemandForecaster] = None
+
+
+def get_forecaster() -> DemandForecaster:
+    global _default_forecaster
+    if _default_forecaster is None:
+        _default_forecaster = DemandForecaster(
+            model_path=settings.model_path,
+            model_cache=ModelCache(
+                cache_dir=os.path.join(settings.model_path, "cache"),
+                max_entries=settings.model_cache_max_entries,
+                max_age_seconds=settings.model_cache_max_age_hours * 3600,
+                max_disk_bytes=settings.model_cache_max_disk_mb * 1024 * 1024
+            )
+        )
+    return _default_forecaster
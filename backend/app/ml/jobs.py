@@ -0,0 +1,108 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from app.config import settings
+
+
+class ForecastJobManager:
+    def __init__(self, ttl_seconds: float = 3600, max_jobs: int = 1000):
+        self.ttl_seconds = ttl_seconds
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, Dict]" = OrderedDict()
+        self._inflight: Dict[Hashable, str] = {}
+
+    def submit(
+        self,
+        key: Hashable,
+        compute: Callable[[], Awaitable[Dict]],
+        params: Dict
+    ) -> Tuple[Dict, bool]:
+        self._expire()
+
+        job_id = self._inflight.get(key)
+        if job_id is not None:
+            job = self._jobs[job_id]
+            job["coalesced_requests"] += 1
+            return job, True
+
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "key": key,
+            "status": "pending",
+            "created_at": datetime.utcnow(),
+            "finished_at": None,
+            "finished_monotonic": None,
+            "coalesced_requests": 0,
+            "result": None,
+            "error": None,
+            "exception": None,
+            **params
+        }
+        self._jobs[job["job_id"]] = job
+        self._inflight[key] = job["job_id"]
+        job["task"] = asyncio.create_task(self._execute(job, compute))
+        return job, False
+
+    async def run(
+        self,
+        key: Hashable,
+        compute: Callable[[], Awaitable[Dict]],
+        params: Dict
+    ) -> Dict:
+        job, _ = self.submit(key, compute, params)
+        return await self.wait(job)
+
+    async def wait(self, job: Dict) -> Dict:
+        # Shield the shared computation from callers that disconnect.
+        await asyncio.shield(job["task"])
+        if job["exception"] is not None:
+            raise job["exception"]
+        return job["result"]
+
+    def get(self, job_id: str, user_id: str) -> Optional[Dict]:
+        self._expire()
+        job = self._jobs.get(job_id)
+        if job is None or job.get("user_id") != user_id:
+            return None
+        return job
+
+    async def _execute(self, job: Dict, compute: Callable[[], Awaitable[Dict]]) -> None:
+        job["status"] = "running"
+        try:
+            job["result"] = await compute()
+            job["status"] = "done"
+        except Exception as e:
+            job["status"] = "failed"
+            job["error"] = str(getattr(e, "detail", e))
+            job["exception"] = e
+        finally:
+            job["finished_at"] = datetime.utcnow()
+            job["finished_monotonic"] = time.monotonic()
+            if self._inflight.get(job["key"]) == job["job_id"]:
+                del self._inflight[job["key"]]
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        for job_id in list(self._jobs):
+            job = self._jobs[job_id]
+            finished = job["finished_monotonic"]
+            too_many = len(self._jobs) > self.max_jobs
+            if finished is not None and (too_many or now - finished > self.ttl_seconds):
+                del self._jobs[job_id]
+
+
+_default_manager: Optional[ForecastJobManager] = None
+
+
+def get_job_manager() -> ForecastJobManager:
+    global _default_manager
+    if _default_manager is None:
+        _default_manager = ForecastJobManager(
+            ttl_seconds=settings.forecast_job_ttl_seconds,
+            max_jobs=settings.forecast_job_max_entries
+        )
+    return _default_manager
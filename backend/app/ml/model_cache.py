@@ -0,0 +1,211 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import joblib
+
+
+# Every forecast worker process has its own cache over the same directory and
+# only counts its own writes, so each rescans after writing this share of the
+# limit. The directory stays within limit * (1 + workers * share).
+DISK_RESCAN_SHARE = 1 / 16
+
+
+class ModelCache:
+    def __init__(
+        self,
+        cache_dir: str,
+        max_entries: int = 256,
+        max_age_seconds: float = 7 * 24 * 3600,
+        max_disk_bytes: int = 512 * 1024 * 1024
+    ):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # Bytes on disk as of the last directory scan plus this process's own
+        # writes and removals since then.
+        self._disk_bytes: Optional[int] = None
+        self._written_since_scan = 0
+
+    def get(self, user_id: str, product_id: str, watermark: str) -> Optional[Any]:
+        key = (str(user_id), str(product_id))
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry["watermark"] == watermark and not self._is_expired(entry):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return entry["model"]
+                del self._memory[key]
+
+        entry = self._load_from_disk(key)
+        if entry is None or entry.get("watermark") != watermark or self._is_expired(entry):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self._store_in_memory(key, entry)
+            self.hits += 1
+        return entry["model"]
+
+    def put(self, user_id: str, product_id: str, watermark: str, model: Any) -> None:
+        key = (str(user_id), str(product_id))
+        entry = {
+            "watermark": watermark,
+            "created_at": time.time(),
+            "model": model
+        }
+
+        with self._lock:
+            self._store_in_memory(key, entry)
+
+        try:
+            path = self._disk_path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            joblib.dump(entry, tmp_path)
+            added = os.path.getsize(tmp_path) - self._file_size(path)
+            os.replace(tmp_path, path)
+            self._enforce_disk_limit(added)
+        except OSError as e:
+            print(f"Failed to persist forecast model for {key}: {e}")
+
+    def invalidate(self, user_id: str, product_id: Optional[str] = None) -> None:
+        user_id = str(user_id)
+
+        with self._lock:
+            for key in list(self._memory):
+                if key[0] == user_id and (product_id is None or key[1] == str(product_id)):
+                    del self._memory[key]
+
+        if product_id is not None:
+            paths = [self._disk_path((user_id, str(product_id)))]
+        else:
+            user_dir = os.path.join(self.cache_dir, self._digest(user_id))
+            if not os.path.isdir(user_dir):
+                return
+            paths = [os.path.join(user_dir, name) for name in os.listdir(user_dir)]
+
+        for path in paths:
+            self._remove(path)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "memory_entries": len(self._memory),
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+    def _store_in_memory(self, key: Tuple[str, str], entry: Dict[str, Any]) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _is_expired(self, entry: Dict[str, Any]) -> bool:
+        return time.time() - entry.get("created_at", 0) > self.max_age_seconds
+
+    def _load_from_disk(self, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        path = self._disk_path(key)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            entry = joblib.load(path)
+        except Exception as e:
+            print(f"Discarding unreadable cached model {path}: {e}")
+            self._remove(path)
+            return None
+
+        if self._is_expired(entry):
+            self._remove(path)
+            return None
+
+        return entry
+
+    @staticmethod
+    def _file_size(path: str) -> int:
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    def _remove(self, path: str) -> None:
+        size = self._file_size(path)
+        try:
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes = max(self._disk_bytes - size, 0)
+
+    def _enforce_disk_limit(self, added: int = 0) -> None:
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += added
+                self._written_since_scan += max(added, 0)
+                if (
+                    self._disk_bytes <= self.max_disk_bytes
+                    and self._written_since_scan <= self.max_disk_bytes * DISK_RESCAN_SHARE
+                ):
+                    return
+
+        # The first write, writes past the limit and every share of the limit
+        # written scan the directory, which also sees the other workers' files.
+        files = []
+        total_size = 0
+        now = time.time()
+
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if now - stat.st_mtime > self.max_age_seconds:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+                total_size += stat.st_size
+
+        if total_size > self.max_disk_bytes:
+            for _, size, path in sorted(files):
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total_size -= size
+                if total_size <= self.max_disk_bytes:
+                    break
+
+        with self._lock:
+            self._disk_bytes = total_size
+            self._written_since_scan = 0
+
+    def _disk_path(self, key: Tuple[str, str]) -> str:
+        user_id, product_id = key
+        return os.path.join(
+            self.cache_dir,
+            self._digest(user_id),
+            f"{self._digest(product_id)}.joblib"
+        )
+
+    @staticmethod
+    def _digest(value: str) -> str:
+        return hashlib.sha1(value.encode("utf-8")).hexdigest()[:16]
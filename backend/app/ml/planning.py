@@ -0,0 +1,54 @@
+from typing import Dict, List
+
+import numpy as np
+from scipy.special import ndtri
+
+
+def demand_matrix(forecasts: List[Dict], horizon: int) -> np.ndarray:
+    matrix = np.full((len(forecasts), horizon), np.nan)
+    for i, forecast_result in enumerate(forecasts):
+        values = [f["predicted_demand"] for f in forecast_result.get("forecast", [])[:horizon]]
+        matrix[i, :len(values)] = values
+    return matrix
+
+
+def plan_reorders(
+    demand: np.ndarray,
+    lead_time_days,
+    service_level,
+    current_quantity
+) -> Dict[str, np.ndarray]:
+    n_products, horizon = demand.shape
+    lead_time_days = np.broadcast_to(np.asarray(lead_time_days, dtype=int), (n_products,))
+    service_level = np.broadcast_to(np.asarray(service_level, dtype=float), (n_products,))
+    current_quantity = np.broadcast_to(np.asarray(current_quantity, dtype=float), (n_products,))
+
+    window = (np.arange(horizon) < lead_time_days[:, None]) & ~np.isnan(demand)
+    days = window.sum(axis=1)
+    lead_time_demand = np.where(window, demand, 0.0).sum(axis=1)
+
+    mean = lead_time_demand / np.maximum(days, 1)
+    variance = np.where(window, (demand - mean[:, None]) ** 2, 0.0).sum(axis=1) / np.maximum(days, 1)
+    demand_std = np.where(days > 1, np.sqrt(variance), lead_time_demand * 0.2)
+
+    safety = ndtri(service_level) * demand_std * np.sqrt(lead_time_days)
+    reorder_point = np.maximum(1, np.round(lead_time_demand + safety)).astype(int)
+    safety_stock = np.maximum(0, np.round(safety)).astype(int)
+
+    needs_reorder = current_quantity <= reorder_point
+    order_quantity = np.where(
+        needs_reorder,
+        np.maximum(0, reorder_point - current_quantity + safety_stock),
+        0
+    )
+
+    return {
+        "has_forecast": days > 0,
+        "lead_time_days": lead_time_days,
+        "service_level": service_level,
+        "lead_time_demand": np.round(lead_time_demand, 2),
+        "safety_stock": safety_stock,
+        "reorder_point": reorder_point,
+        "needs_reorder": needs_reorder,
+        "recommended_order_quantity": order_quantity.astype(int)
+    }
@@ -0,0 +1,244 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from bson import ObjectId
+
+from app.config import settings
+from app.database import get_collection
+from app.ml.executor import get_forecast_executor
+from app.ml.segmentation import refresh_segments, segment_tiers
+from app.utils.rollups import DAILY_ROLLUPS_COLLECTION
+
+
+RETRAINS_COLLECTION = "forecast_retrains"
+
+
+def serialize_events(events: List[Dict]) -> List[Dict]:
+    return [
+        {
+            "date": event["date"].isoformat() if hasattr(event["date"], "isoformat") else str(event["date"]),
+            "impact_level": event.get("impact_level", "medium")
+        }
+        for event in events
+    ]
+
+
+def is_stale(computed_at: datetime) -> bool:
+    return datetime.utcnow() - computed_at > timedelta(days=settings.retrain_interval_days)
+
+
+def trim_forecast(result: Dict, forecast_days: int) -> Dict:
+    tomorrow = (datetime.utcnow() + timedelta(days=1)).strftime("%Y-%m-%d")
+    forecast = [f for f in result.get("forecast", []) if f["date"] >= tomorrow][:forecast_days]
+
+    trimmed = {**result, "forecast": forecast}
+    if "total_predicted_demand" in result:
+        trimmed["total_predicted_demand"] = round(sum(f["predicted_demand"] for f in forecast), 2)
+    return trimmed
+
+
+def slice_precomputed(doc: Dict, forecast_days: int) -> Optional[Dict]:
+    result = trim_forecast(doc["result"], forecast_days)
+
+    if len(result["forecast"]) < forecast_days:
+        return None
+
+    result.update({
+        "computed_at": doc["computed_at"],
+        "stale": is_stale(doc["computed_at"]),
+        "source": "precomputed"
+    })
+    return result
+
+
+async def load_precomputed(
+    user_id: str,
+    product_ids: List[str],
+    forecast_days: int
+) -> Dict[str, Dict]:
+    forecasts_collection = get_collection("forecasts")
+
+    docs = await forecasts_collection.find({
+        "user_id": ObjectId(user_id),
+        "product_id": {"$in": product_ids}
+    }).to_list(length=None)
+
+    results = {}
+    for doc in docs:
+        sliced = slice_precomputed(doc, forecast_days)
+        if sliced is not None:
+            results[doc["product_id"]] = sliced
+    return results
+
+
+async def store_forecasts(user_id: str, results: Dict[str, Dict]) -> None:
+    forecasts_collection = get_collection("forecasts")
+    computed_at = datetime.utcnow()
+
+    for product_id, result in results.items():
+        # Budget-degraded forecasts are not worth serving for a whole retrain cycle.
+        if not result.get("forecast") or result.get("degraded"):
+            continue
+        await forecasts_collection.update_one(
+            {"user_id": ObjectId(user_id), "product_id": product_id},
+            {
+                "$set": {
+                    "result": result,
+                    "model": result.get("model"),
+                    "forecast_days": len(result["forecast"]),
+                    "computed_at": computed_at
+                }
+            },
+            upsert=True
+        )
+
+
+def fit_time_report(results: Dict[str, Dict]) -> str:
+    prophet_fits = [r for r in results.values() if r.get("model") == "prophet" and "fit_ms" in r]
+    parts = [f"{len(results)} products"]
+
+    for label, warm in (("warm", True), ("cold", False)):
+        fit_ms = [r["fit_ms"] for r in prophet_fits if bool(r.get("warm_start")) == warm]
+        if fit_ms:
+            parts.append(
+                f"{len(fit_ms)} {label}-start Prophet fits, "
+                f"mean {sum(fit_ms) / len(fit_ms):.0f}ms, total {sum(fit_ms) / 1000:.1f}s"
+            )
+
+    return "; ".join(parts)
+
+
+class RetrainScheduler:
+    def __init__(
+        self,
+        retrain_interval_days: int = 7,
+        check_interval_seconds: float = 3600,
+        forecast_days: int = 90,
+        min_data_points: int = 30
+    ):
+        self.retrain_interval = timedelta(days=retrain_interval_days)
+        self.check_interval_seconds = check_interval_seconds
+        self.forecast_days = forecast_days
+        self.min_data_points = min_data_points
+        self._task: Optional[asyncio.Task] = None
+        self._last_run: Dict[str, datetime] = {}
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run_forever(self) -> None:
+        await get_collection("forecasts").create_index(
+            [("user_id", 1), ("product_id", 1)],
+            unique=True
+        )
+        while True:
+            try:
+                await self.run_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Forecast retraining cycle failed: {e}")
+            await asyncio.sleep(self.check_interval_seconds)
+
+    async def run_due(self) -> None:
+        products_collection = get_collection("products")
+        retrains_collection = get_collection(RETRAINS_COLLECTION)
+
+        tenant_ids = await products_collection.distinct("user_id", {"is_active": True})
+
+        # Single-product refreshes also write forecasts, so the tenant-wide
+        # retrain keeps its own marker rather than trusting computed_at.
+        markers = await retrains_collection.find(
+            {"user_id": {"$in": tenant_ids}}
+        ).to_list(length=None)
+        last_retrain = {marker["user_id"]: marker["last_retrain_at"] for marker in markers}
+
+        for tenant_id in tenant_ids:
+            last_run = self._last_run.get(str(tenant_id))
+            if last_run and datetime.utcnow() - last_run < self.retrain_interval:
+                continue
+            retrained_at = last_retrain.get(tenant_id)
+            if retrained_at and datetime.utcnow() - retrained_at < self.retrain_interval:
+                continue
+            try:
+                await self.refresh_tenant(str(tenant_id))
+                self._last_run[str(tenant_id)] = datetime.utcnow()
+                await retrains_collection.update_one(
+                    {"user_id": tenant_id},
+                    {"$set": {"last_retrain_at": self._last_run[str(tenant_id)]}},
+                    upsert=True
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Forecast retraining failed for tenant {tenant_id}: {e}")
+
+    async def refresh_tenant(self, user_id: str) -> Dict[str, Dict]:
+        products_collection = get_collection("products")
+        rollups_collection = get_collection(DAILY_ROLLUPS_COLLECTION)
+        events_collection = get_collection("events")
+
+        await refresh_segments(user_id)
+
+        active_products = await products_collection.find(
+            {"user_id": ObjectId(user_id), "is_active": True},
+            {"_id": 1, "segment": 1}
+        ).to_list(length=None)
+        tiers = segment_tiers(active_products)
+        active_ids = {
+            str(product["_id"])
+            for product in active_products
+            if tiers.get(str(product["_id"])) != "dead"
+        }
+
+        counts = await rollups_collection.aggregate([
+            {"$match": {"user_id": ObjectId(user_id)}},
+            {"$group": {"_id": "$product_id", "rows": {"$sum": "$order_count"}}},
+            {"$match": {"rows": {"$gte": self.min_data_points}}}
+        ]).to_list(length=None)
+
+        product_ids = [c["_id"] for c in counts if c["_id"] in active_ids]
+        if not product_ids:
+            return {}
+
+        daily_sales = await rollups_collection.find({"user_id": ObjectId(user_id)}).to_list(length=None)
+        events = await events_collection.find({"is_public": True}).to_list(length=None)
+
+        results = await get_forecast_executor().forecast_products_demand(
+            product_ids=product_ids,
+            sales_data=daily_sales,
+            forecast_days=self.forecast_days,
+            events=serialize_events(events),
+            user_id=user_id,
+            tiers=tiers
+        )
+
+        await store_forecasts(user_id, results)
+        print(f"Forecast retraining for tenant {user_id}: {fit_time_report(results)}")
+        return results
+
+
+_default_scheduler: Optional[RetrainScheduler] = None
+
+
+def get_retrain_scheduler() -> RetrainScheduler:
+    global _default_scheduler
+    if _default_scheduler is None:
+        _default_scheduler = RetrainScheduler(
+            retrain_interval_days=settings.retrain_interval_days,
+            check_interval_seconds=settings.forecast_scheduler_check_seconds,
+            forecast_days=settings.precomputed_forecast_days,
+            min_data_points=settings.min_data_points_for_forecast
+        )
+    return _default_scheduler
@@ -0,0 +1,162 @@
+import asyncio
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from app.config import settings
+from app.database import get_collection
+from app.utils.rollups import DAILY_ROLLUPS_COLLECTION, sale_day
+
+
+WEEK_MS = 7 * 24 * 3600 * 1000
+
+# Cumulative revenue share cut-offs for A and B, and weekly-demand
+# coefficient of variation cut-offs for X and Y.
+ABC_THRESHOLDS = (0.80, 0.95)
+XYZ_THRESHOLDS = (0.5, 1.0)
+
+# Forecast effort per tier: full Prophet with events, the usual automatic
+# selection, a smoothing model only, or no forecast at all.
+SEGMENT_TIERS = ("full", "standard", "cheap", "dead")
+
+
+def segmentation_pipeline(user_id: str, since: datetime) -> List[Dict]:
+    return [
+        {"$match": {"user_id": ObjectId(user_id), "day": {"$gte": since}}},
+        {
+            "$group": {
+                "_id": {
+                    "product_id": "$product_id",
+                    "week": {"$floor": {"$divide": [{"$subtract": ["$day", since]}, WEEK_MS]}}
+                },
+                "quantity": {"$sum": "$quantity"},
+                "revenue": {"$sum": "$revenue"}
+            }
+        },
+        {
+            "$group": {
+                "_id": "$_id.product_id",
+                "quantity": {"$sum": "$quantity"},
+                "quantity_sq": {"$sum": {"$multiply": ["$quantity", "$quantity"]}},
+                "revenue": {"$sum": "$revenue"}
+            }
+        }
+    ]
+
+
+def classify_segments(product_ids: List[str], stats: List[Dict], weeks: int) -> Dict[str, Dict]:
+    by_id = {doc["_id"]: doc for doc in stats}
+    revenue = np.array([by_id.get(pid, {}).get("revenue", 0) for pid in product_ids], dtype=float)
+    quantity = np.array([by_id.get(pid, {}).get("quantity", 0) for pid in product_ids], dtype=float)
+    quantity_sq = np.array([by_id.get(pid, {}).get("quantity_sq", 0) for pid in product_ids], dtype=float)
+
+    total_revenue = revenue.sum()
+    share = revenue / total_revenue if total_revenue > 0 else np.zeros(len(product_ids))
+
+    # A product is A while the revenue ranked above it is still under 80%.
+    order = np.argsort(-share, kind="stable")
+    share_above = np.empty(len(product_ids))
+    share_above[order] = np.cumsum(share[order]) - share[order]
+    abc = np.where(
+        share_above < ABC_THRESHOLDS[0], "A",
+        np.where(share_above < ABC_THRESHOLDS[1], "B", "C")
+    )
+
+    # Weeks without sales count as zero demand.
+    mean = quantity / weeks
+    std = np.sqrt(np.maximum(quantity_sq / weeks - mean ** 2, 0))
+    cv = np.divide(std, mean, out=np.full(len(product_ids), np.inf), where=mean > 0)
+    xyz = np.where(cv <= XYZ_THRESHOLDS[0], "X", np.where(cv <= XYZ_THRESHOLDS[1], "Y", "Z"))
+
+    dead = quantity <= 0
+    full = (abc == "A") & (xyz != "Z")
+    cheap = (abc == "C") | (xyz == "Z")
+    tier = np.where(dead, "dead", np.where(full, "full", np.where(cheap, "cheap", "standard")))
+
+    return {
+        pid: {
+            "abc": str(abc[i]),
+            "xyz": str(xyz[i]),
+            "tier": str(tier[i]),
+            "revenue_share": round(float(share[i]), 4),
+            "cv": None if np.isinf(cv[i]) else round(float(cv[i]), 3)
+        }
+        for i, pid in enumerate(product_ids)
+    }
+
+
+def segment_tiers(products: List[Dict]) -> Dict[str, str]:
+    return {
+        str(product["_id"]): product["segment"]["tier"]
+        for product in products
+        if product.get("segment", {}).get("tier")
+    }
+
+
+async def refresh_segments(user_id: str, window_days: Optional[int] = None) -> Dict[str, Dict]:
+    window_days = window_days or settings.segmentation_window_days
+    weeks = max(1, -(-window_days // 7))
+    # Exactly `weeks` whole weeks ending today, so no partial extra week.
+    since = sale_day(datetime.utcnow()) - timedelta(days=weeks * 7 - 1)
+
+    products_collection = get_collection("products")
+    rollups_collection = get_collection(DAILY_ROLLUPS_COLLECTION)
+
+    products = await products_collection.find(
+        {"user_id": ObjectId(user_id), "is_active": True},
+        {"segment": 1}
+    ).to_list(length=None)
+    if not products:
+        return {}
+
+    stats = await rollups_collection.aggregate(segmentation_pipeline(user_id, since)).to_list(length=None)
+    segments = classify_segments([str(p["_id"]) for p in products], stats, weeks)
+
+    # Only products whose class changed are written back.
+    now = datetime.utcnow()
+    updates = []
+    for product in products:
+        segment = segments[str(product["_id"])]
+        current = product.get("segment") or {}
+        if all(current.get(key) == segment[key] for key in ("abc", "xyz", "tier")):
+            continue
+        updates.append(UpdateOne(
+            {"_id": product["_id"]},
+            {"$set": {"segment": {**segment, "updated_at": now}}}
+        ))
+
+    if updates:
+        await products_collection.bulk_write(updates, ordered=False)
+
+    _last_refresh[user_id] = now
+    _last_refresh.move_to_end(user_id)
+    while len(_last_refresh) > settings.segmentation_max_tenants:
+        _last_refresh.popitem(last=False)
+    return segments
+
+
+_last_refresh: "OrderedDict[str, datetime]" = OrderedDict()
+_refreshing: Dict[str, asyncio.Task] = {}
+
+
+async def refresh_segments_if_due(user_id: str) -> None:
+    last = _last_refresh.get(user_id)
+    interval = timedelta(minutes=settings.segmentation_refresh_minutes)
+    if last is not None and datetime.utcnow() - last < interval:
+        return
+
+    task = _refreshing.get(user_id)
+    if task is None or task.done():
+        task = _refreshing[user_id] = asyncio.ensure_future(refresh_segments(user_id))
+
+    try:
+        await task
+    except Exception as e:
+        print(f"Product segmentation failed for tenant {user_id}: {e}")
+    finally:
+        if task.done() and _refreshing.get(user_id) is task:
+            del _refreshing[user_id]
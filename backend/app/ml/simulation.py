@@ -0,0 +1,134 @@
+import functools
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.ml.executor import get_forecast_executor
+from app.ml.smoothing import INTERVAL_Z
+
+
+def interval_arrays(forecasts: List[Dict], horizon: int) -> Dict[str, np.ndarray]:
+    mean = np.zeros((len(forecasts), horizon))
+    sigma = np.zeros((len(forecasts), horizon))
+
+    for i, forecast_result in enumerate(forecasts):
+        forecast = forecast_result.get("forecast", [])[:horizon]
+        days = len(forecast)
+        mean[i, :days] = [f["predicted_demand"] for f in forecast]
+        # Forecast bounds are 80% intervals, i.e. +/- INTERVAL_Z sigma.
+        sigma[i, :days] = [
+            (f["upper_bound"] - f["lower_bound"]) / (2 * INTERVAL_Z) for f in forecast
+        ]
+
+    return {"mean": mean, "sigma": np.maximum(sigma, 0)}
+
+
+def simulate_policies(
+    mean: np.ndarray,
+    sigma: np.ndarray,
+    current_quantity: np.ndarray,
+    lead_time_days: np.ndarray,
+    reorder_points: np.ndarray,
+    order_up_to: np.ndarray,
+    unit_holding_cost: np.ndarray,
+    scenarios: int,
+    seed: Optional[int] = None
+) -> Dict[str, np.ndarray]:
+    n_products, horizon = mean.shape
+    n_policies = len(reorder_points)
+    lead_time_days = np.maximum(np.asarray(lead_time_days, dtype=int), 1)
+
+    rng = np.random.default_rng(seed)
+    # Every policy sees the same demand paths, so their differences are not noise.
+    demand = np.maximum(
+        rng.normal(mean[:, None, :], sigma[:, None, :], size=(n_products, scenarios, horizon)),
+        0
+    )
+
+    rows = np.arange(n_products)[:, None]
+    columns = np.arange(scenarios)[None, :]
+
+    metrics = {
+        name: np.zeros((n_policies, n_products))
+        for name in ("stockout_probability", "expected_stockout_days", "expected_holding_cost", "expected_orders")
+    }
+
+    for k in range(n_policies):
+        reorder_point = reorder_points[k][:, None]
+        target = order_up_to[k][:, None]
+
+        stock = np.repeat(np.asarray(current_quantity, dtype=float)[:, None], scenarios, axis=1)
+        arrivals = np.zeros((n_products, scenarios, horizon + lead_time_days.max() + 1))
+        on_order = np.zeros((n_products, scenarios))
+        stocked_out = np.zeros((n_products, scenarios), dtype=bool)
+        stockout_days = np.zeros((n_products, scenarios))
+        orders = np.zeros((n_products, scenarios))
+        held = np.zeros((n_products, scenarios))
+
+        for day in range(horizon):
+            stock += arrivals[:, :, day]
+            on_order -= arrivals[:, :, day]
+
+            short = demand[:, :, day] > stock
+            stocked_out |= short
+            stockout_days += short
+            stock = np.maximum(stock - demand[:, :, day], 0)
+            held += stock
+
+            position = stock + on_order
+            order = np.where(position <= reorder_point, target - position, 0)
+            arrivals[rows, columns, (day + lead_time_days)[:, None]] += order
+            on_order += order
+            orders += order > 0
+
+        metrics["stockout_probability"][k] = stocked_out.mean(axis=1)
+        metrics["expected_stockout_days"][k] = stockout_days.mean(axis=1)
+        metrics["expected_holding_cost"][k] = held.mean(axis=1) * unit_holding_cost
+        metrics["expected_orders"][k] = orders.mean(axis=1)
+
+    return metrics
+
+
+async def run_simulation(
+    mean: np.ndarray,
+    sigma: np.ndarray,
+    current_quantity: np.ndarray,
+    lead_time_days: np.ndarray,
+    reorder_points: np.ndarray,
+    order_up_to: np.ndarray,
+    unit_holding_cost: np.ndarray,
+    scenarios: int,
+    seed: Optional[int] = None,
+    max_cells: int = 5_000_000
+) -> Dict[str, np.ndarray]:
+    n_products, horizon = mean.shape
+    # Bound each worker's products x scenarios x days arrays.
+    chunk_size = max(1, max_cells // (scenarios * max(horizon, 1)))
+    executor = get_forecast_executor()
+
+    async def simulate_chunk(start: int):
+        return start, await executor.run(
+            simulate_policies,
+            mean[start:start + chunk_size],
+            sigma[start:start + chunk_size],
+            current_quantity[start:start + chunk_size],
+            lead_time_days[start:start + chunk_size],
+            reorder_points[:, start:start + chunk_size],
+            order_up_to[:, start:start + chunk_size],
+            unit_holding_cost[start:start + chunk_size],
+            scenarios,
+            None if seed is None else seed + start
+        )
+
+    finished = {}
+    async for start, chunk in executor.iter_bounded([
+        functools.partial(simulate_chunk, start)
+        for start in range(0, n_products, chunk_size)
+    ]):
+        finished[start] = chunk
+    chunks = [finished[start] for start in sorted(finished)]
+
+    return {
+        name: np.concatenate([chunk[name] for chunk in chunks], axis=1)
+        for name in chunks[0]
+    }
@@ -0,0 +1,180 @@
+import numpy as np
+from typing import Dict, Tuple
+
+
+SMOOTHING_METHODS = ("ses", "holt", "holt_winters", "croston", "sba")
+
+# Prophet's default interval_width is 0.8, keep the bands comparable.
+INTERVAL_Z = 1.2816
+
+ALPHA_GRID = np.linspace(0.05, 0.95, 19)
+TREND_GRID = np.array([0.01, 0.05, 0.1, 0.2, 0.3])
+SEASON_GRID = np.array([0.05, 0.15, 0.3])
+DAMPING = 0.98
+TREND_INIT_WINDOW = 7
+
+
+def _sigma(sse: float, count: int, y: np.ndarray) -> float:
+    if count > 0:
+        sigma = np.sqrt(sse / count)
+        if sigma > 0:
+            return float(sigma)
+    return float(np.std(y)) if len(y) > 1 else float(abs(y[0]) * 0.3)
+
+
+def simple_exponential_smoothing(y: np.ndarray, steps: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    alphas = ALPHA_GRID
+    level = np.full(alphas.shape, y[0], dtype=float)
+    sse = np.zeros(alphas.shape)
+
+    for value in y[1:]:
+        error = value - level
+        sse += error * error
+        level += alphas * error
+
+    best = int(np.argmin(sse))
+    alpha = alphas[best]
+    sigma = _sigma(sse[best], len(y) - 1, y)
+
+    yhat = np.full(steps.shape, level[best])
+    spread = sigma * np.sqrt(1 + (steps - 1) * alpha ** 2)
+    return yhat, spread
+
+
+def holt(y: np.ndarray, steps: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    alphas, betas = np.meshgrid(ALPHA_GRID, TREND_GRID)
+    alphas, betas = alphas.ravel(), betas.ravel()
+
+    # Start the trend from the slope between the first two windows, not one
+    # noisy pair of days.
+    m = min(TREND_INIT_WINDOW, len(y) // 2)
+    initial_trend = (y[m:2 * m].mean() - y[:m].mean()) / m if m > 0 else 0.0
+
+    level = np.full(alphas.shape, y[0], dtype=float)
+    trend = np.full(alphas.shape, initial_trend, dtype=float)
+    sse = np.zeros(alphas.shape)
+
+    for value in y[1:]:
+        predicted = level + DAMPING * trend
+        error = value - predicted
+        sse += error * error
+        new_level = predicted + alphas * error
+        trend = DAMPING * trend + alphas * betas * error
+        level = new_level
+
+    best = int(np.argmin(sse))
+    alpha, beta = alphas[best], betas[best]
+    sigma = _sigma(sse[best], len(y) - 1, y)
+
+    damping_sum = np.cumsum(DAMPING ** np.arange(1, steps.max() + 1))
+    yhat = level[best] + damping_sum[steps - 1] * trend[best]
+
+    weights = np.concatenate([[0.0], np.cumsum((alpha + alpha * beta * damping_sum[:-1]) ** 2)])
+    spread = sigma * np.sqrt(1 + weights[steps - 1])
+    return yhat, spread
+
+
+def holt_winters(
+    y: np.ndarray,
+    steps: np.ndarray,
+    season_length: int = 7
+) -> Tuple[np.ndarray, np.ndarray]:
+    m = season_length
+    if len(y) < 2 * m:
+        return holt(y, steps)
+
+    grid = np.array(np.meshgrid(ALPHA_GRID[::2], TREND_GRID[:3], SEASON_GRID)).reshape(3, -1)
+    alphas, betas, gammas = grid
+
+    first_mean = y[:m].mean()
+    level = np.full(alphas.shape, first_mean)
+    trend = np.full(alphas.shape, (y[m:2 * m].mean() - first_mean) / m)
+    season = np.tile(y[:m] - first_mean, (len(alphas), 1))
+    sse = np.zeros(alphas.shape)
+
+    for t in range(m, len(y)):
+        slot = t % m
+        s = season[:, slot]
+        error = y[t] - (level + trend + s)
+        sse += error * error
+        new_level = alphas * (y[t] - s) + (1 - alphas) * (level + trend)
+        trend = betas * (new_level - level) + (1 - betas) * trend
+        season[:, slot] = gammas * (y[t] - new_level) + (1 - gammas) * s
+        level = new_level
+
+    best = int(np.argmin(sse))
+    alpha, beta = alphas[best], betas[best]
+    sigma = _sigma(sse[best], len(y) - m, y)
+
+    slots = (len(y) - 1 + steps) % m
+    yhat = level[best] + steps * trend[best] + season[best, slots]
+
+    horizon = np.arange(1, steps.max() + 1)
+    weights = np.concatenate([[0.0], np.cumsum((alpha + horizon[:-1] * alpha * beta) ** 2)])
+    spread = sigma * np.sqrt(1 + weights[steps - 1])
+    return yhat, spread
+
+
+def croston(
+    y: np.ndarray,
+    steps: np.ndarray,
+    alpha: float = 0.1,
+    sba: bool = True
+) -> Tuple[np.ndarray, np.ndarray]:
+    nonzero = np.flatnonzero(y > 0)
+    if len(nonzero) == 0:
+        return np.zeros(steps.shape), np.zeros(steps.shape)
+
+    size = float(y[nonzero[0]])
+    interval = float(nonzero[0] + 1)
+    periods_since = 1
+    fitted = np.empty(len(y))
+
+    for t, value in enumerate(y):
+        fitted[t] = size / interval
+        if value > 0:
+            size += alpha * (value - size)
+            interval += alpha * (periods_since - interval)
+            periods_since = 1
+        else:
+            periods_since += 1
+
+    correction = (1 - alpha / 2) if sba else 1.0
+    rate = correction * size / interval
+    errors = y[nonzero[0] + 1:] - correction * fitted[nonzero[0] + 1:]
+    sigma = _sigma(float(np.sum(errors * errors)), len(errors), y)
+
+    return np.full(steps.shape, rate), np.full(steps.shape, sigma)
+
+
+def is_intermittent(y: np.ndarray, threshold: float = 0.5) -> bool:
+    return len(y) > 0 and float(np.mean(y == 0)) >= threshold
+
+
+def smoothing_forecast(
+    y: np.ndarray,
+    steps: np.ndarray,
+    method: str,
+    season_length: int = 7
+) -> Dict[str, np.ndarray]:
+    y = np.asarray(y, dtype=float)
+    steps = np.asarray(steps, dtype=int)
+
+    if method == "ses":
+        yhat, spread = simple_exponential_smoothing(y, steps)
+    elif method == "holt":
+        yhat, spread = holt(y, steps)
+    elif method == "holt_winters":
+        yhat, spread = holt_winters(y, steps, season_length)
+    elif method == "croston":
+        yhat, spread = croston(y, steps, sba=False)
+    elif method == "sba":
+        yhat, spread = croston(y, steps, sba=True)
+    else:
+        raise ValueError(f"Unknown smoothing method: {method}")
+
+    return {
+        "yhat": np.maximum(yhat, 0),
+        "lower": np.maximum(yhat - INTERVAL_Z * spread, 0),
+        "upper": np.maximum(yhat + INTERVAL_Z * spread, 0)
+    }
@@ -0,0 +1,83 @@
+import math
+from collections import deque
+from typing import Deque, Dict, Tuple
+
+import numpy as np
+
+
+# Forecast tiers from most to least accurate. A budgeted request walks down
+# from its preferred model until the expected fit time fits the budget.
+MODEL_TIERS = ("prophet", "holt_winters", "holt", "ses")
+
+DEFAULT_FIT_SECONDS = {
+    "prophet": 2.0,
+    "holt_winters": 0.05,
+    "holt": 0.02,
+    "ses": 0.01,
+    "croston": 0.01,
+    "sba": 0.01
+}
+
+WARM_START_METHOD = "prophet_warm"
+
+
+class FitTimeTracker:
+    def __init__(self, max_samples: int = 50, quantile: float = 0.9):
+        self.max_samples = max_samples
+        self.quantile = quantile
+        self._samples: Dict[Tuple[str, int], Deque[float]] = {}
+
+    @staticmethod
+    def bucket(history_days: int) -> int:
+        return int(math.log2(max(history_days, 1)))
+
+    def record(self, method: str, history_days: int, seconds: float) -> None:
+        key = (method, self.bucket(history_days))
+        samples = self._samples.get(key)
+        if samples is None:
+            samples = self._samples[key] = deque(maxlen=self.max_samples)
+        samples.append(seconds)
+
+    def estimate(self, method: str, history_days: int) -> float:
+        target = self.bucket(history_days)
+        buckets = [bucket for name, bucket in self._samples if name == method]
+        if not buckets:
+            if method == WARM_START_METHOD:
+                return self.estimate("prophet", history_days)
+            return DEFAULT_FIT_SECONDS.get(method, 0.0)
+
+        # Fall back to the nearest recorded history length, scaled linearly.
+        nearest = min(buckets, key=lambda bucket: abs(bucket - target))
+        seconds = float(np.quantile(self._samples[(method, nearest)], self.quantile))
+        return seconds * 2.0 ** (target - nearest)
+
+    def choose(
+        self,
+        preferred: str,
+        history_days: int,
+        budget_seconds: float,
+        warm_start: bool = False
+    ) -> str:
+        if preferred not in MODEL_TIERS:
+            return preferred
+
+        tiers = MODEL_TIERS[MODEL_TIERS.index(preferred):]
+        for method in tiers:
+            timed_as = WARM_START_METHOD if warm_start and method == "prophet" else method
+            if self.estimate(timed_as, history_days) <= budget_seconds:
+                return method
+        return tiers[-1]
+
+    def summary(self) -> Dict[str, Dict]:
+        methods: Dict[str, list] = {}
+        for (method, _), samples in self._samples.items():
+            methods.setdefault(method, []).extend(samples)
+
+        return {
+            method: {
+                "fits": len(samples),
+                "mean_ms": round(float(np.mean(samples)) * 1000, 1),
+                "p90_ms": round(float(np.quantile(samples, self.quantile)) * 1000, 1)
+            }
+            for method, samples in methods.items()
+        }
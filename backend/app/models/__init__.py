@@ -1,7 +1,17 @@
 from app.models.user import User, UserCreate, UserUpdate, UserResponse, Token, TokenData
 from app.models.product import Product, ProductCreate, ProductUpdate, ProductResponse, ProductWithStats
-from app.models.sale import Sale, SaleCreate, SaleResponse, SaleItem, SalesAnalytics
+from app.models.sale import (
+    Sale,
+    SaleCreate,
+    SaleResponse,
+    SaleItem,
+    SalesAnalytics,
+    SaleBulkRecord,
+    SaleBulkOutcome,
+    SaleBulkResponse,
+)
 from app.models.event import Event, EventCreate, EventResponse
+from app.models.forecast import ForecastJobCreate, ForecastJobResponse, SimulationRequest
 
 __all__ = [
     "User",
@@ -20,7 +30,13 @@ __all__ = [
     "SaleResponse",
     "SaleItem",
     "SalesAnalytics",
+    "SaleBulkRecord",
+    "SaleBulkOutcome",
+    "SaleBulkResponse",
     "Event",
     "EventCreate",
     "EventResponse",
+    "ForecastJobCreate",
+    "ForecastJobResponse",
+    "SimulationRequest",
 ]
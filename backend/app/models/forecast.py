@@ -0,0 +1,34 @@
+from pydantic import BaseModel, Field
+from typing import Annotated, Optional, Any, Dict, List
+from datetime import datetime
+
+
+class ForecastJobCreate(BaseModel):
+    product_id: str
+    forecast_days: int = Field(default=30, ge=7, le=90)
+    model: str = "auto"
+    time_budget_ms: Optional[int] = Field(default=None, ge=100, le=600000)
+
+
+class ForecastJobResponse(BaseModel):
+    job_id: str
+    product_id: str
+    forecast_days: int
+    model: str
+    status: str
+    coalesced: bool = False
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    result: Optional[Any] = None
+    error: Optional[str] = None
+
+
+class SimulationRequest(BaseModel):
+    product_ids: Optional[List[str]] = None
+    horizon_days: int = Field(default=30, ge=7, le=90)
+    scenarios: int = Field(default=1000, ge=100, le=10000)
+    service_levels: List[float] = Field(default=[0.8, 0.9, 0.95, 0.99], min_length=1, max_length=10)
+    lead_time_days: int = Field(default=7, ge=1, le=30)
+    supplier_lead_times: Dict[str, Annotated[int, Field(ge=1, le=30)]] = Field(default_factory=dict)
+    holding_cost_rate: float = Field(default=0.25, ge=0, le=5)
+    seed: Optional[int] = None
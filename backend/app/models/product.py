@@ -54,12 +54,22 @@ class Product(ProductBase):
         json_encoders = {ObjectId: str}
 
 
+class ProductSegment(BaseModel):
+    abc: str
+    xyz: str
+    tier: str
+    revenue_share: float = 0
+    cv: Optional[float] = None
+    updated_at: Optional[datetime] = None
+
+
 class ProductResponse(ProductBase):
     id: str
     user_id: str
     is_active: bool
     created_at: datetime
     updated_at: datetime
+    segment: Optional[ProductSegment] = None
 
     class Config:
         populate_by_name = True
@@ -1,6 +1,6 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from typing import Optional, List
-from datetime import datetime
+from datetime import datetime, timezone
 from bson import ObjectId
 from app.models.user import PyObjectId
 
@@ -26,6 +26,34 @@ class SaleCreate(SaleBase):
     pass
 
 
+class SaleBulkRecord(SaleCreate):
+    idempotency_key: Optional[str] = Field(None, min_length=1, max_length=128)
+    sale_date: Optional[datetime] = None
+
+    @field_validator("sale_date")
+    @classmethod
+    def sale_date_to_utc(cls, v: Optional[datetime]) -> Optional[datetime]:
+        # Stored dates and rollup buckets are naive UTC.
+        if v is not None and v.tzinfo is not None:
+            return v.astimezone(timezone.utc).replace(tzinfo=None)
+        return v
+
+
+class SaleBulkOutcome(BaseModel):
+    index: int
+    status: str
+    idempotency_key: Optional[str] = None
+    sale_id: Optional[str] = None
+    error: Optional[str] = None
+
+
+class SaleBulkResponse(BaseModel):
+    created: int
+    duplicates: int
+    rejected: int
+    results: List[SaleBulkOutcome]
+
+
 class Sale(SaleBase):
     id: Optional[PyObjectId] = Field(alias="_id", default=None)
     user_id: PyObjectId
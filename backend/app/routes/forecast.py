@@ -1,21 +1,28 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Request
 from bson import ObjectId
-from typing import Optional
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from datetime import datetime
+import numpy as np
 
+from app.models.forecast import ForecastJobCreate, ForecastJobResponse, SimulationRequest
 from app.utils.auth import get_current_user_id
+from app.utils.streaming import wants_ndjson, ndjson_response
 from app.database import get_collection
-from app.ml.forecaster import DemandForecaster
+from app.ml.forecaster import get_forecaster, forecast_to_columnar, FORECAST_MODELS, HIERARCHICAL_MODELS
+from app.ml.executor import get_forecast_executor, ForecastQueueFullError
+from app.ml.elasticity import get_elasticity_estimator
+from app.ml.jobs import get_job_manager
+from app.ml.planning import demand_matrix, plan_reorders
+from app.ml.scheduler import serialize_events, load_precomputed, store_forecasts, trim_forecast
+from app.ml.segmentation import refresh_segments_if_due, segment_tiers
+from app.ml.simulation import interval_arrays, run_simulation
+from app.config import settings
+from app.utils.rollups import DAILY_ROLLUPS_COLLECTION, rollup_watermark
 
 router = APIRouter(prefix="/forecast", tags=["Forecasting"])
 
 
-@router.post("/demand/{product_id}")
-async def forecast_demand(
-    product_id: str,
-    forecast_days: int = Query(30, ge=7, le=90),
-    user_id: str = Depends(get_current_user_id)
-):
+async def _get_product_or_404(product_id: str, user_id: str) -> Dict:
     if not ObjectId.is_valid(product_id):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -23,8 +30,6 @@ async def forecast_demand(
         )
     
     products_collection = get_collection("products")
-    sales_collection = get_collection("sales")
-    events_collection = get_collection("events")
     
     product = await products_collection.find_one({
         "_id": ObjectId(product_id),
@@ -37,28 +42,180 @@ async def forecast_demand(
             detail="Product not found"
         )
     
-    sales = await sales_collection.find({"user_id": ObjectId(user_id)}).to_list(length=None)
+    return product
+
+
+async def _submit_demand_job(
+    user_id: str,
+    product: Dict,
+    forecast_days: int,
+    model: str,
+    time_budget_ms: Optional[int] = None
+) -> Tuple[Dict, bool]:
+    products_collection = get_collection("products")
+    rollups_collection = get_collection(DAILY_ROLLUPS_COLLECTION)
+    events_collection = get_collection("events")
+    
+    product_id = str(product["_id"])
+    tiers = segment_tiers([product])
+    categories = None
+    rollups_query = {"user_id": ObjectId(user_id), "product_id": product_id}
     
-    events = await events_collection.find({"is_public": True}).to_list(length=None)
-    events_list = [
-        {
-            "date": event["date"].isoformat() if hasattr(event["date"], "isoformat") else str(event["date"]),
-            "impact_level": event.get("impact_level", "medium")
-        }
-        for event in events
-    ]
+    if model in HIERARCHICAL_MODELS:
+        # The category model needs the sales of every active product in the
+        # category, the same split /reorder-points uses.
+        siblings = await products_collection.find(
+            {"user_id": ObjectId(user_id), "category": product.get("category"), "is_active": True},
+            {"_id": 1}
+        ).to_list(length=None)
+        categories = {str(sibling["_id"]): product.get("category") for sibling in siblings}
+        categories[product_id] = product.get("category")
+        rollups_query["product_id"] = {"$in": list(categories)}
+    elif model == "global":
+        # The cross-product model is trained on the whole active catalog, as
+        # the scheduler does, and shares the tenant-wide cache entry.
+        active_products = await products_collection.find(
+            {"user_id": ObjectId(user_id), "is_active": True},
+            {"_id": 1}
+        ).to_list(length=None)
+        active_ids = {str(active["_id"]) for active in active_products} | {product_id}
+        rollups_query["product_id"] = {"$in": list(active_ids)}
+    
+    daily_sales = await rollups_collection.find(rollups_query).sort("day", 1).to_list(length=None)
+    
+    async def compute() -> Dict:
+        events = await events_collection.find({"is_public": True}).to_list(length=None)
+        events_list = serialize_events(events)
+        
+        horizon = max(forecast_days, settings.precomputed_forecast_days) if model == "auto" else forecast_days
+        
+        forecast_result = await get_forecast_executor().forecast_product_demand(
+            product_id=product_id,
+            sales_data=daily_sales,
+            forecast_days=horizon,
+            events=events_list,
+            user_id=user_id,
+            model=model,
+            time_budget_ms=time_budget_ms,
+            categories=categories,
+            tiers=tiers
+        )
+        
+        if model == "auto":
+            await store_forecasts(user_id, {product_id: forecast_result})
+        
+        forecast_result = trim_forecast(forecast_result, forecast_days)
+        forecast_result.update({
+            "computed_at": datetime.utcnow(),
+            "stale": False,
+            "source": "live"
+        })
+        return forecast_result
+    
+    # Identical requests against unchanged sales history share one computation.
+    key = (
+        user_id, product_id, forecast_days, model, time_budget_ms,
+        tiers.get(product_id), rollup_watermark(daily_sales)
+    )
+    
+    return get_job_manager().submit(key, compute, {
+        "user_id": user_id,
+        "product_id": product_id,
+        "forecast_days": forecast_days,
+        "model": model
+    })
+
+
+def _job_response(job: Dict, coalesced: bool = False) -> ForecastJobResponse:
+    return ForecastJobResponse(
+        job_id=job["job_id"],
+        product_id=job["product_id"],
+        forecast_days=job["forecast_days"],
+        model=job["model"],
+        status=job["status"],
+        coalesced=coalesced,
+        created_at=job["created_at"],
+        finished_at=job["finished_at"],
+        result=job["result"],
+        error=job["error"]
+    )
+
+
+@router.post("/demand/{product_id}")
+async def forecast_demand(
+    product_id: str,
+    forecast_days: int = Query(30, ge=7, le=90),
+    model: str = Query("auto", pattern=f"^({'|'.join(FORECAST_MODELS)})$"),
+    refresh: bool = Query(False),
+    forecast_format: str = Query("records", alias="format", pattern="^(records|columnar)$"),
+    time_budget_ms: Optional[int] = Query(None, ge=100, le=600000),
+    user_id: str = Depends(get_current_user_id)
+):
+    product = await _get_product_or_404(product_id, user_id)
+    
+    if model == "auto" and not refresh:
+        precomputed = await load_precomputed(user_id, [product_id], forecast_days)
+        if product_id in precomputed:
+            if forecast_format == "columnar":
+                return forecast_to_columnar(precomputed[product_id])
+            return precomputed[product_id]
     
-    forecaster = DemandForecaster()
-    forecast_result = forecaster.forecast_product_demand(
-        product_id=product_id,
-        sales_data=sales,
-        forecast_days=forecast_days,
-        events=events_list
+    job, _ = await _submit_demand_job(
+        user_id, product, forecast_days, model,
+        time_budget_ms or settings.forecast_time_budget_ms or None
     )
     
+    try:
+        forecast_result = await get_job_manager().wait(job)
+    except ForecastQueueFullError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+    
+    if forecast_format == "columnar":
+        return forecast_to_columnar(forecast_result)
+    
     return forecast_result
 
 
+@router.post("/jobs", response_model=ForecastJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_forecast_job(
+    job_data: ForecastJobCreate,
+    user_id: str = Depends(get_current_user_id)
+):
+    if job_data.model not in FORECAST_MODELS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown forecast model: {job_data.model}"
+        )
+    
+    product = await _get_product_or_404(job_data.product_id, user_id)
+    
+    job, coalesced = await _submit_demand_job(
+        user_id, product, job_data.forecast_days, job_data.model,
+        job_data.time_budget_ms or settings.forecast_time_budget_ms or None
+    )
+    
+    return _job_response(job, coalesced)
+
+
+@router.get("/jobs/{job_id}", response_model=ForecastJobResponse)
+async def get_forecast_job(
+    job_id: str,
+    user_id: str = Depends(get_current_user_id)
+):
+    job = get_job_manager().get(job_id, user_id)
+    
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Forecast job not found"
+        )
+    
+    return _job_response(job)
+
+
 @router.post("/pricing/{product_id}")
 async def recommend_pricing(
     product_id: str,
@@ -71,7 +228,7 @@ async def recommend_pricing(
         )
     
     products_collection = get_collection("products")
-    sales_collection = get_collection("sales")
+    rollups_collection = get_collection(DAILY_ROLLUPS_COLLECTION)
     
     product = await products_collection.find_one({
         "_id": ObjectId(product_id),
@@ -84,27 +241,151 @@ async def recommend_pricing(
             detail="Product not found"
         )
     
-    sales = await sales_collection.find({"user_id": ObjectId(user_id)}).to_list(length=None)
+    daily_sales = await rollups_collection.find({
+        "user_id": ObjectId(user_id),
+        "product_id": product_id
+    }).sort("day", 1).to_list(length=None)
     
     product["id"] = str(product["_id"])
     
-    forecaster = DemandForecaster()
+    elasticities = await get_elasticity_estimator().estimate(user_id, [product["id"]])
+    
+    forecaster = get_forecaster()
     pricing_result = forecaster.optimize_pricing(
         product_data=product,
-        sales_data=sales
+        sales_data=daily_sales,
+        price_elasticity=float(elasticities[0])
     )
     
     return pricing_result
 
 
+async def _iter_reorder_forecasts(
+    user_id: str,
+    product_ids: List[str],
+    forecast_days: int,
+    model: str,
+    refresh: bool,
+    time_budget_ms: Optional[int] = None,
+    categories: Optional[Dict[str, str]] = None,
+    tiers: Optional[Dict[str, str]] = None
+) -> AsyncIterator[Dict[str, Dict]]:
+    forecasts = {}
+    
+    if model == "auto" and not refresh:
+        forecasts = await load_precomputed(user_id, product_ids, forecast_days)
+        if forecasts:
+            yield forecasts
+    
+    missing_ids = [pid for pid in product_ids if pid not in forecasts]
+    
+    if not missing_ids:
+        return
+    
+    rollups_collection = get_collection(DAILY_ROLLUPS_COLLECTION)
+    events_collection = get_collection("events")
+    
+    daily_sales = await rollups_collection.find({"user_id": ObjectId(user_id)}).to_list(length=None)
+    events = await events_collection.find({"is_public": True}).to_list(length=None)
+    events_list = serialize_events(events)
+    
+    horizon = max(forecast_days, settings.precomputed_forecast_days) if model == "auto" else forecast_days
+    
+    async for batch in get_forecast_executor().iter_products_demand(
+        product_ids=missing_ids,
+        sales_data=daily_sales,
+        forecast_days=horizon,
+        events=events_list,
+        user_id=user_id,
+        model=model,
+        time_budget_ms=time_budget_ms,
+        categories=categories,
+        tiers=tiers
+    ):
+        if model == "auto":
+            await store_forecasts(user_id, batch)
+        
+        computed_at = datetime.utcnow()
+        trimmed = {}
+        for pid, result in batch.items():
+            trimmed[pid] = trim_forecast(result, forecast_days)
+            trimmed[pid].update({"computed_at": computed_at, "stale": False, "source": "live"})
+        yield trimmed
+
+
+def _supplier_lead_times(values: List[str]) -> Dict[str, int]:
+    lead_times = {}
+    for value in values:
+        supplier, _, days = value.rpartition("=")
+        if not supplier or not days.isdigit() or not 1 <= int(days) <= 30:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid supplier lead time: {value}"
+            )
+        lead_times[supplier] = int(days)
+    return lead_times
+
+
+def _reorder_rows(
+    products: List[Dict],
+    forecast_results: List[Dict],
+    lead_times: np.ndarray,
+    service_level: float
+) -> List[Dict]:
+    plan = plan_reorders(
+        demand_matrix(forecast_results, int(lead_times.max())),
+        lead_times,
+        service_level,
+        [product.get("quantity", 0) for product in products]
+    )
+    
+    columns = zip(
+        products,
+        forecast_results,
+        plan["has_forecast"].tolist(),
+        plan["reorder_point"].tolist(),
+        plan["safety_stock"].tolist(),
+        plan["needs_reorder"].tolist(),
+        plan["recommended_order_quantity"].tolist(),
+        plan["lead_time_days"].tolist()
+    )
+    
+    return [
+        {
+            "product_id": str(product["_id"]),
+            "product_name": product["name"],
+            "category": product.get("category"),
+            "current_quantity": product.get("quantity", 0),
+            "reorder_point": reorder_point,
+            "safety_stock": safety_stock,
+            "needs_reorder": needs_reorder,
+            "recommended_order_quantity": order_quantity,
+            "lead_time_days": lead_time_days,
+            "forecast_confidence": forecast_result.get("confidence", "low")
+        }
+        for (
+            product, forecast_result, has_forecast, reorder_point,
+            safety_stock, needs_reorder, order_quantity, lead_time_days
+        ) in columns
+        if has_forecast
+    ]
+
+
 @router.get("/reorder-points")
 async def get_reorder_points(
+    request: Request,
     user_id: str = Depends(get_current_user_id),
-    lead_time_days: int = Query(7, ge=1, le=30)
+    lead_time_days: int = Query(7, ge=1, le=30),
+    supplier_lead_time: List[str] = Query([]),
+    service_level: float = Query(0.95, ge=0.5, le=0.999),
+    model: str = Query("auto", pattern=f"^({'|'.join(FORECAST_MODELS)})$"),
+    refresh: bool = Query(False),
+    time_budget_ms: Optional[int] = Query(None, ge=100, le=600000)
 ):
+    supplier_lead_times = _supplier_lead_times(supplier_lead_time)
     products_collection = get_collection("products")
-    sales_collection = get_collection("sales")
-    events_collection = get_collection("events")
+    
+    await refresh_segments_if_due(user_id)
     
     products = await products_collection.find({
         "user_id": ObjectId(user_id),
@@ -114,71 +395,244 @@ async def get_reorder_points(
     if not products:
         return {"products": [], "message": "No products found"}
     
-    sales = await sales_collection.find({"user_id": ObjectId(user_id)}).to_list(length=None)
-    events = await events_collection.find({"is_public": True}).to_list(length=None)
-    events_list = [
-        {
-            "date": event["date"].isoformat() if hasattr(event["date"], "isoformat") else str(event["date"]),
-            "impact_level": event.get("impact_level", "medium")
-        }
-        for event in events
-    ]
+    products_by_id = {str(product["_id"]): product for product in products}
+    lead_times = {
+        pid: supplier_lead_times.get(product.get("supplier"), lead_time_days)
+        for pid, product in products_by_id.items()
+    }
+    forecast_days = max(lead_times.values()) * 2
     
-    forecaster = DemandForecaster()
-    results = []
+    forecasts = _iter_reorder_forecasts(
+        user_id, list(products_by_id), forecast_days, model, refresh,
+        time_budget_ms or settings.forecast_time_budget_ms or None,
+        {pid: product.get("category") for pid, product in products_by_id.items()},
+        segment_tiers(products)
+    )
     
-    for product in products:
-        product_id = str(product["_id"])
-        
-        forecast_result = forecaster.forecast_product_demand(
-            product_id=product_id,
-            sales_data=sales,
-            forecast_days=lead_time_days * 2,
-            events=events_list
+    def plan_batch(batch: Dict[str, Dict]) -> List[Dict]:
+        pids = list(batch)
+        if not pids:
+            return []
+        return _reorder_rows(
+            [products_by_id[pid] for pid in pids],
+            [batch[pid] for pid in pids],
+            np.array([lead_times[pid] for pid in pids]),
+            service_level
         )
-        
-        if forecast_result.get("forecast"):
-            reorder_info = forecaster.calculate_reorder_point(
-                forecast_data=forecast_result,
-                lead_time_days=lead_time_days
-            )
-            
-            current_quantity = product.get("quantity", 0)
-            reorder_point = reorder_info["reorder_point"]
+    
+    if wants_ndjson(request):
+        async def stream():
+            total_products = 0
+            needs_reorder_count = 0
+            computed_times = []
+            stale = False
             
-            needs_reorder = current_quantity <= reorder_point
+            try:
+                async for batch in forecasts:
+                    for forecast_result in batch.values():
+                        if forecast_result.get("computed_at"):
+                            computed_times.append(forecast_result["computed_at"])
+                        stale = stale or bool(forecast_result.get("stale"))
+                    
+                    for row in plan_batch(batch):
+                        total_products += 1
+                        needs_reorder_count += int(row["needs_reorder"])
+                        yield row
+            except Exception as e:
+                # Headers are already sent; an error line tells the client the
+                # rows stop early rather than at the end of the catalog.
+                if not isinstance(e, ForecastQueueFullError):
+                    print(f"Reorder point stream failed for tenant {user_id}: {e}")
+                yield {"error": str(e)}
             
-            results.append({
-                "product_id": product_id,
-                "product_name": product["name"],
-                "category": product.get("category"),
-                "current_quantity": current_quantity,
-                "reorder_point": reorder_point,
-                "safety_stock": reorder_info["safety_stock"],
-                "needs_reorder": needs_reorder,
-                "recommended_order_quantity": max(
-                    0,
-                    reorder_point - current_quantity + reorder_info["safety_stock"]
-                ) if needs_reorder else 0,
-                "forecast_confidence": forecast_result.get("confidence", "low")
-            })
+            yield {
+                "summary": {
+                    "needs_reorder_count": needs_reorder_count,
+                    "total_products": total_products,
+                    "computed_at": min(computed_times) if computed_times else None,
+                    "stale": stale
+                }
+            }
+        
+        return ndjson_response(stream())
+    
+    all_forecasts = {}
+    try:
+        async for batch in forecasts:
+            all_forecasts.update(batch)
+    except ForecastQueueFullError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+    
+    results = plan_batch({pid: all_forecasts[pid] for pid in products_by_id})
     
     needs_reorder_list = [r for r in results if r["needs_reorder"]]
+    computed_times = [f["computed_at"] for f in all_forecasts.values() if f.get("computed_at")]
     
     return {
         "products": results,
         "needs_reorder_count": len(needs_reorder_list),
         "total_products": len(results),
-        "needs_reorder": needs_reorder_list
+        "needs_reorder": needs_reorder_list,
+        "computed_at": min(computed_times) if computed_times else None,
+        "stale": any(f.get("stale") for f in all_forecasts.values())
+    }
+
+
+@router.post("/simulate")
+async def simulate_inventory(
+    simulation: SimulationRequest,
+    user_id: str = Depends(get_current_user_id)
+):
+    if not all(0.5 <= level < 1 for level in simulation.service_levels):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Service levels must be between 0.5 and 1"
+        )
+    
+    products_collection = get_collection("products")
+    
+    query = {"user_id": ObjectId(user_id), "is_active": True}
+    if simulation.product_ids:
+        if not all(ObjectId.is_valid(pid) for pid in simulation.product_ids):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid product ID"
+            )
+        query["_id"] = {"$in": [ObjectId(pid) for pid in simulation.product_ids]}
+    
+    products = await products_collection.find(query).to_list(length=None)
+    
+    if not products:
+        return {"products": [], "message": "No products found"}
+    
+    products_by_id = {str(product["_id"]): product for product in products}
+    horizon = simulation.horizon_days
+    
+    all_forecasts = {}
+    try:
+        async for batch in _iter_reorder_forecasts(
+            user_id, list(products_by_id), horizon, "auto", False
+        ):
+            all_forecasts.update(batch)
+    except ForecastQueueFullError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+    
+    pids = [pid for pid in products_by_id if all_forecasts.get(pid, {}).get("forecast")]
+    if not pids:
+        return {"products": [], "message": "Insufficient data for simulation"}
+    
+    forecasts = [all_forecasts[pid] for pid in pids]
+    current_quantity = np.array([products_by_id[pid].get("quantity", 0) for pid in pids], dtype=float)
+    lead_times = np.array([
+        min(simulation.supplier_lead_times.get(products_by_id[pid].get("supplier"), simulation.lead_time_days), horizon)
+        for pid in pids
+    ])
+    unit_holding_cost = np.array([
+        products_by_id[pid].get("cost_price", 0) * simulation.holding_cost_rate / 365
+        for pid in pids
+    ])
+    
+    # Each candidate policy reorders at the service-level reorder point and
+    # tops stock up by one lead time's worth of demand.
+    demand = demand_matrix(forecasts, int(lead_times.max()))
+    plans = [
+        plan_reorders(demand, lead_times, level, current_quantity)
+        for level in simulation.service_levels
+    ]
+    reorder_points = np.array([plan["reorder_point"] for plan in plans], dtype=float)
+    order_up_to = np.array([
+        plan["reorder_point"] + np.maximum(np.ceil(plan["lead_time_demand"]), 1)
+        for plan in plans
+    ])
+    
+    intervals = interval_arrays(forecasts, horizon)
+    
+    try:
+        metrics = await run_simulation(
+            intervals["mean"],
+            intervals["sigma"],
+            current_quantity,
+            lead_times,
+            reorder_points,
+            order_up_to,
+            unit_holding_cost,
+            simulation.scenarios,
+            simulation.seed,
+            settings.simulation_max_cells
+        )
+    except ForecastQueueFullError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+    
+    results = []
+    for i, pid in enumerate(pids):
+        policies = [
+            {
+                "service_level": level,
+                "reorder_point": int(reorder_points[k, i]),
+                "order_up_to": int(order_up_to[k, i]),
+                "stockout_probability": round(float(metrics["stockout_probability"][k, i]), 4),
+                "expected_stockout_days": round(float(metrics["expected_stockout_days"][k, i]), 2),
+                "expected_holding_cost": round(float(metrics["expected_holding_cost"][k, i]), 2),
+                "expected_orders": round(float(metrics["expected_orders"][k, i]), 2)
+            }
+            for k, level in enumerate(simulation.service_levels)
+        ]
+        
+        meeting_target = [p for p in policies if p["stockout_probability"] <= 1 - p["service_level"]]
+        if meeting_target:
+            recommended = min(meeting_target, key=lambda p: p["expected_holding_cost"])
+        else:
+            recommended = min(policies, key=lambda p: p["stockout_probability"])
+        
+        product = products_by_id[pid]
+        results.append({
+            "product_id": pid,
+            "product_name": product["name"],
+            "current_quantity": product.get("quantity", 0),
+            "lead_time_days": int(lead_times[i]),
+            "policies": policies,
+            "recommended_policy": recommended
+        })
+    
+    return {
+        "products": results,
+        "scenarios": simulation.scenarios,
+        "horizon_days": horizon,
+        "total_products": len(results)
+    }
+
+
+def _pricing_row(product: Dict, pricing_result: Dict) -> Dict:
+    price_diff = pricing_result["recommended_price"] - product.get("selling_price", 0)
+    
+    return {
+        "product_id": str(product["_id"]),
+        "product_name": product["name"],
+        "category": product.get("category"),
+        "current_price": product.get("selling_price", 0),
+        "recommended_price": pricing_result["recommended_price"],
+        "price_difference": round(price_diff, 2),
+        "expected_margin_percent": pricing_result.get("expected_margin_percent"),
+        "needs_adjustment": abs(price_diff) > 0.01
     }
 
 
 @router.post("/batch-pricing")
 async def batch_recommend_pricing(
+    request: Request,
     user_id: str = Depends(get_current_user_id)
 ):
     products_collection = get_collection("products")
-    sales_collection = get_collection("sales")
+    rollups_collection = get_collection(DAILY_ROLLUPS_COLLECTION)
     
     products = await products_collection.find({
         "user_id": ObjectId(user_id),
@@ -188,31 +642,43 @@ async def batch_recommend_pricing(
     if not products:
         return {"products": [], "message": "No products found"}
     
-    sales = await sales_collection.find({"user_id": ObjectId(user_id)}).to_list(length=None)
+    daily_sales = await rollups_collection.find({"user_id": ObjectId(user_id)}).to_list(length=None)
     
-    forecaster = DemandForecaster()
-    results = []
+    elasticities = await get_elasticity_estimator().estimate(
+        user_id, [str(product["_id"]) for product in products]
+    )
     
-    for product in products:
-        product["id"] = str(product["_id"])
-        
-        pricing_result = forecaster.optimize_pricing(
-            product_data=product,
-            sales_data=sales
-        )
-        
-        price_diff = pricing_result["recommended_price"] - product.get("selling_price", 0)
+    pricing_results = get_forecaster().optimize_pricing_batch(
+        products, daily_sales, elasticities=elasticities
+    )
+    
+    if wants_ndjson(request):
+        async def stream():
+            total_products = 0
+            needs_adjustment_count = 0
+            try:
+                for product, pricing_result in zip(products, pricing_results):
+                    row = _pricing_row(product, pricing_result)
+                    total_products += 1
+                    needs_adjustment_count += int(row["needs_adjustment"])
+                    yield row
+            except Exception as e:
+                print(f"Batch pricing stream failed for tenant {user_id}: {e}")
+                yield {"error": str(e)}
+            
+            yield {
+                "summary": {
+                    "needs_adjustment_count": needs_adjustment_count,
+                    "total_products": total_products
+                }
+            }
         
-        results.append({
-            "product_id": str(product["_id"]),
-            "product_name": product["name"],
-            "category": product.get("category"),
-            "current_price": product.get("selling_price", 0),
-            "recommended_price": pricing_result["recommended_price"],
-            "price_difference": round(price_diff, 2),
-            "expected_margin_percent": pricing_result["expected_margin_percent"],
-            "needs_adjustment": abs(price_diff) > 0.01
-        })
+        return ndjson_response(stream())
+    
+    results = [
+        _pricing_row(product, pricing_result)
+        for product, pricing_result in zip(products, pricing_results)
+    ]
     
     needs_adjustment = [r for r in results if r["needs_adjustment"]]
     
@@ -5,11 +5,14 @@ from typing import List
 
 from app.utils.auth import get_current_user_id
 from app.database import get_collection
+from app.utils.response_cache import cached_response
+from app.utils.rollups import DAILY_ROLLUPS_COLLECTION, sale_day
 
 router = APIRouter(prefix="/inventory", tags=["Inventory"])
 
 
 @router.get("/alerts")
+@cached_response("inventory.alerts", ("products",))
 async def get_inventory_alerts(user_id: str = Depends(get_current_user_id)):
     products_collection = get_collection("products")
     
@@ -81,9 +84,10 @@ async def get_inventory_alerts(user_id: str = Depends(get_current_user_id)):
 
 
 @router.get("/summary")
+@cached_response("inventory.summary", ("products", "sales"))
 async def get_inventory_summary(user_id: str = Depends(get_current_user_id)):
     products_collection = get_collection("products")
-    sales_collection = get_collection("sales")
+    rollups_collection = get_collection(DAILY_ROLLUPS_COLLECTION)
     
     products = await products_collection.find({
         "user_id": ObjectId(user_id),
@@ -108,18 +112,17 @@ async def get_inventory_summary(user_id: str = Depends(get_current_user_id)):
         categories[category]["value"] += product.get("cost_price", 0) * product.get("quantity", 0)
     
     thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    recent_sales = await sales_collection.find({
-        "user_id": ObjectId(user_id),
-        "sale_date": {"$gte": thirty_days_ago}
-    }).to_list(length=None)
+    turnover_rows = await rollups_collection.aggregate([
+        {
+            "$match": {
+                "user_id": ObjectId(user_id),
+                "day": {"$gte": sale_day(thirty_days_ago)}
+            }
+        },
+        {"$group": {"_id": "$product_id", "quantity": {"$sum": "$quantity"}}}
+    ]).to_list(length=None)
     
-    product_turnover = {}
-    for sale in recent_sales:
-        for item in sale.get("items", []):
-            pid = item["product_id"]
-            if pid not in product_turnover:
-                product_turnover[pid] = 0
-            product_turnover[pid] += item["quantity"]
+    product_turnover = {row["_id"]: row["quantity"] for row in turnover_rows}
     
     slow_moving = []
     fast_moving = []
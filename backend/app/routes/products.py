@@ -6,6 +6,7 @@ from datetime import datetime
 from app.models.product import ProductCreate, ProductUpdate, ProductResponse, ProductWithStats
 from app.utils.auth import get_current_user_id
 from app.database import get_collection
+from app.utils.response_cache import cached_response, get_response_cache
 
 router = APIRouter(prefix="/products", tags=["Products"])
 
@@ -24,6 +25,7 @@ async def create_product(
     product_dict["updated_at"] = datetime.utcnow()
     
     result = await products_collection.insert_one(product_dict)
+    await get_response_cache().invalidate(user_id, "products")
     created_product = await products_collection.find_one({"_id": result.inserted_id})
     
     return ProductResponse(
@@ -167,6 +169,8 @@ async def update_product(
             detail="Product not found"
         )
     
+    await get_response_cache().invalidate(user_id, "products")
+    
     updated_product = await products_collection.find_one({"_id": ObjectId(product_id)})
     
     return ProductResponse(
@@ -199,9 +203,12 @@ async def delete_product(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not found"
         )
+    
+    await get_response_cache().invalidate(user_id, "products")
 
 
 @router.get("/categories/list", response_model=List[str])
+@cached_response("products.categories", ("products",))
 async def list_categories(user_id: str = Depends(get_current_user_id)):
     products_collection = get_collection("products")
     
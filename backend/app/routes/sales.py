@@ -1,11 +1,33 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Request, status, Depends, Query
 from bson import ObjectId
-from typing import List, Optional
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 
-from app.models.sale import SaleCreate, SaleResponse, SalesAnalytics
+from app.config import settings
+from app.models.sale import (
+    SaleBulkOutcome,
+    SaleBulkRecord,
+    SaleBulkResponse,
+    SaleCreate,
+    SaleResponse,
+    SalesAnalytics,
+)
+from app.utils.analytics import daily_trend, sales_analytics_pipeline
 from app.utils.auth import get_current_user_id
+from app.utils.response_cache import cached_response, get_response_cache
+from app.utils.streaming import ndjson_lines, sends_ndjson
 from app.database import get_collection
+from app.utils.rollups import (
+    ANALYTICS_ROLLUPS_COLLECTION,
+    DAILY_ROLLUPS_COLLECTION,
+    analytics_rollup_updates,
+    daily_rollup_updates,
+    sale_day,
+)
+from app.utils.stock import DUPLICATE_KEY, InsufficientStockError, apply_stock_changes, stock_demand
+from app.ml.segmentation import refresh_segments_if_due
 
 router = APIRouter(prefix="/sales", tags=["Sales"])
 
@@ -13,10 +35,13 @@ router = APIRouter(prefix="/sales", tags=["Sales"])
 @router.post("", response_model=SaleResponse, status_code=status.HTTP_201_CREATED)
 async def record_sale(
     sale_data: SaleCreate,
+    background_tasks: BackgroundTasks,
     user_id: str = Depends(get_current_user_id)
 ):
     products_collection = get_collection("products")
     sales_collection = get_collection("sales")
+    rollups_collection = get_collection(DAILY_ROLLUPS_COLLECTION)
+    analytics_collection = get_collection(ANALYTICS_ROLLUPS_COLLECTION)
     
     for item in sale_data.items:
         if not ObjectId.is_valid(item.product_id):
@@ -24,45 +49,330 @@ async def record_sale(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Invalid product ID: {item.product_id}"
             )
-        
-        product = await products_collection.find_one({
-            "_id": ObjectId(item.product_id),
+    
+    sale_dict = sale_data.model_dump()
+    demand = stock_demand(sale_dict["items"])
+    
+    products = await products_collection.find(
+        {
+            "_id": {"$in": [ObjectId(pid) for pid in demand]},
             "user_id": ObjectId(user_id)
-        })
+        },
+        {"name": 1, "quantity": 1, "cost_price": 1, "category": 1}
+    ).to_list(length=None)
+    products_by_id = {str(product["_id"]): product for product in products}
+    
+    for product_id, quantity in demand.items():
+        product = products_by_id.get(product_id)
         
         if not product:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Product not found: {item.product_id}"
+                detail=f"Product not found: {product_id}"
             )
         
-        if product["quantity"] < item.quantity:
+        if product["quantity"] < quantity:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Insufficient stock for {product['name']}"
             )
     
-    for item in sale_data.items:
-        await products_collection.update_one(
-            {"_id": ObjectId(item.product_id)},
-            {
-                "$inc": {"quantity": -item.quantity},
-                "$set": {"updated_at": datetime.utcnow()}
-            }
-        )
+    cost_prices = {pid: product.get("cost_price", 0) for pid, product in products_by_id.items()}
     
-    sale_dict = sale_data.model_dump()
     sale_dict["user_id"] = ObjectId(user_id)
     sale_dict["sale_date"] = datetime.utcnow()
-    sale_dict["created_at"] = datetime.utcnow()
+    sale_dict["created_at"] = sale_dict["sale_date"]
+    
+    async def write_sale(session):
+        result = await sales_collection.insert_one(sale_dict, session=session)
+        return result.inserted_id
     
-    result = await sales_collection.insert_one(sale_dict)
-    created_sale = await sales_collection.find_one({"_id": result.inserted_id})
+    async def write_rollups(session):
+        # A sale without items still counts in the tenant analytics, but has
+        # no daily product rows.
+        daily_updates = daily_rollup_updates(
+            user_id,
+            sale_dict["_id"],
+            sale_dict["sale_date"],
+            sale_dict["items"],
+            cost_prices
+        )
+        if daily_updates:
+            await rollups_collection.bulk_write(daily_updates, ordered=False, session=session)
+        await analytics_collection.bulk_write(
+            analytics_rollup_updates(user_id, [sale_dict], products_by_id),
+            ordered=False,
+            session=session
+        )
+    
+    # The stock check above can race with other sales; the guarded
+    # decrement is what actually decides.
+    try:
+        sale_id = await apply_stock_changes(user_id, demand, write_sale, write_rollups)
+    except InsufficientStockError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Insufficient stock for one or more items"
+        )
+    
+    await get_response_cache().invalidate(user_id, "sales", "products")
+    background_tasks.add_task(refresh_segments_if_due, user_id)
     
     return SaleResponse(
-        id=str(created_sale["_id"]),
-        user_id=str(created_sale["user_id"]),
-        **{k: v for k, v in created_sale.items() if k not in ["_id", "user_id"]}
+        id=str(sale_id),
+        user_id=user_id,
+        **{k: v for k, v in sale_dict.items() if k not in ["_id", "user_id"]}
+    )
+
+
+SALES_BULK_ATTEMPTS = 2
+
+_idempotency_index_ready = False
+
+
+async def _ensure_idempotency_index() -> None:
+    global _idempotency_index_ready
+    if _idempotency_index_ready:
+        return
+    
+    await get_collection("sales").create_index(
+        [("user_id", 1), ("idempotency_key", 1)],
+        unique=True,
+        partialFilterExpression={"idempotency_key": {"$type": "string"}}
+    )
+    _idempotency_index_ready = True
+
+
+async def _bulk_sale_records(request: Request) -> AsyncIterator[Tuple[Optional[SaleBulkRecord], Optional[str]]]:
+    if sends_ndjson(request):
+        async for line in ndjson_lines(request):
+            try:
+                yield SaleBulkRecord.model_validate_json(line), None
+            except ValidationError as e:
+                yield None, _validation_message(e)
+        return
+    
+    try:
+        body = await request.json()
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Body must be a JSON array or NDJSON of sales"
+        )
+    
+    if not isinstance(body, list):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Body must be a JSON array or NDJSON of sales"
+        )
+    
+    for record in body:
+        try:
+            yield SaleBulkRecord.model_validate(record), None
+        except ValidationError as e:
+            yield None, _validation_message(e)
+
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in err['loc']) or 'record'}: {err['msg']}"
+        for err in error.errors()
+    )
+
+
+def _bulk_record_error(record: SaleBulkRecord, products_by_id: Dict, stock: Dict[str, int]) -> Optional[str]:
+    for item in record.items:
+        if not ObjectId.is_valid(item.product_id):
+            return f"Invalid product ID: {item.product_id}"
+        if item.product_id not in products_by_id:
+            return f"Product not found: {item.product_id}"
+    
+    for product_id, quantity in stock_demand([item.model_dump() for item in record.items]).items():
+        if stock[product_id] < quantity:
+            return f"Insufficient stock for {products_by_id[product_id]['name']}"
+    
+    return None
+
+
+async def _write_sale_batch(user_id: str, batch: List[Tuple[int, SaleBulkRecord]]) -> List[SaleBulkOutcome]:
+    products_collection = get_collection("products")
+    sales_collection = get_collection("sales")
+    rollups_collection = get_collection(DAILY_ROLLUPS_COLLECTION)
+    analytics_collection = get_collection(ANALYTICS_ROLLUPS_COLLECTION)
+    
+    keys = [record.idempotency_key for _, record in batch if record.idempotency_key]
+    sale_ids = {}
+    if keys:
+        existing = await sales_collection.find(
+            {"user_id": ObjectId(user_id), "idempotency_key": {"$in": keys}},
+            {"idempotency_key": 1}
+        ).to_list(length=None)
+        sale_ids = {doc["idempotency_key"]: str(doc["_id"]) for doc in existing}
+    
+    product_ids = {
+        item.product_id
+        for _, record in batch
+        for item in record.items
+        if ObjectId.is_valid(item.product_id)
+    }
+    products = await products_collection.find(
+        {
+            "_id": {"$in": [ObjectId(pid) for pid in product_ids]},
+            "user_id": ObjectId(user_id)
+        },
+        {"name": 1, "quantity": 1, "cost_price": 1, "category": 1}
+    ).to_list(length=None)
+    products_by_id = {str(product["_id"]): product for product in products}
+    stock = {pid: product["quantity"] for pid, product in products_by_id.items()}
+    
+    outcomes = []
+    sales = []
+    demand: Dict[str, int] = {}
+    now = datetime.utcnow()
+    
+    # Records take stock in the order the till recorded them.
+    for index, record in batch:
+        key = record.idempotency_key
+        if key in sale_ids:
+            outcomes.append(SaleBulkOutcome(
+                index=index, status="duplicate", idempotency_key=key, sale_id=sale_ids[key]
+            ))
+            continue
+        
+        error = _bulk_record_error(record, products_by_id, stock)
+        if error:
+            outcomes.append(SaleBulkOutcome(
+                index=index, status="rejected", idempotency_key=key, error=error
+            ))
+            continue
+        
+        sale_dict = record.model_dump(exclude={"idempotency_key", "sale_date"})
+        sale_dict["_id"] = ObjectId()
+        sale_dict["user_id"] = ObjectId(user_id)
+        sale_dict["sale_date"] = record.sale_date or now
+        sale_dict["created_at"] = now
+        if key:
+            sale_dict["idempotency_key"] = key
+            sale_ids[key] = str(sale_dict["_id"])
+        
+        for product_id, quantity in stock_demand(sale_dict["items"]).items():
+            stock[product_id] -= quantity
+            demand[product_id] = demand.get(product_id, 0) + quantity
+        
+        sales.append(sale_dict)
+        outcomes.append(SaleBulkOutcome(
+            index=index, status="created", idempotency_key=key, sale_id=str(sale_dict["_id"])
+        ))
+    
+    if not sales:
+        return outcomes
+    
+    cost_prices = {pid: product.get("cost_price", 0) for pid, product in products_by_id.items()}
+    
+    # One rollup update per product and day for the whole batch.
+    by_day: Dict[datetime, List[Dict]] = {}
+    for sale_dict in sales:
+        by_day.setdefault(sale_day(sale_dict["sale_date"]), []).append(sale_dict)
+    rollup_updates = [
+        update
+        for day, day_sales in by_day.items()
+        for update in daily_rollup_updates(
+            user_id,
+            max(sale_dict["_id"] for sale_dict in day_sales),
+            day,
+            [item for sale_dict in day_sales for item in sale_dict["items"]],
+            cost_prices
+        )
+    ]
+    
+    async def write_sales(session):
+        try:
+            await sales_collection.insert_many(sales, ordered=False, session=session)
+        except Exception:
+            # Unordered inserts keep every document that did not fail; without
+            # a transaction they are removed so the retry starts clean.
+            if session is None:
+                await sales_collection.delete_many({"_id": {"$in": [sale_dict["_id"] for sale_dict in sales]}})
+            raise
+    
+    async def write_rollups(session):
+        if rollup_updates:
+            await rollups_collection.bulk_write(rollup_updates, ordered=False, session=session)
+        await analytics_collection.bulk_write(
+            analytics_rollup_updates(user_id, sales, products_by_id),
+            ordered=False,
+            session=session
+        )
+    
+    await apply_stock_changes(user_id, demand, write_sales, write_rollups)
+    return outcomes
+
+
+def _only_duplicate_keys(error: BulkWriteError) -> bool:
+    write_errors = error.details.get("writeErrors", [])
+    return bool(write_errors) and all(err.get("code") == DUPLICATE_KEY for err in write_errors)
+
+
+async def _ingest_sale_batch(user_id: str, batch: List[Tuple[int, SaleBulkRecord]]) -> List[SaleBulkOutcome]:
+    for _ in range(SALES_BULK_ATTEMPTS):
+        try:
+            return await _write_sale_batch(user_id, batch)
+        except InsufficientStockError:
+            pass
+        except BulkWriteError as e:
+            if not _only_duplicate_keys(e):
+                raise
+        # Another writer took stock or an idempotency key between the reads
+        # and the write; the attempt was rolled back, and the next one sees it.
+    
+    return [
+        SaleBulkOutcome(
+            index=index,
+            status="rejected",
+            idempotency_key=record.idempotency_key,
+            error="Stock changed while syncing, retry this sale"
+        )
+        for index, record in batch
+    ]
+
+
+@router.post("/bulk", response_model=SaleBulkResponse)
+async def record_sales_bulk(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    user_id: str = Depends(get_current_user_id)
+):
+    await _ensure_idempotency_index()
+    
+    results: List[SaleBulkOutcome] = []
+    batch: List[Tuple[int, SaleBulkRecord]] = []
+    index = 0
+    
+    async for record, error in _bulk_sale_records(request):
+        if record is None:
+            results.append(SaleBulkOutcome(index=index, status="rejected", error=error))
+        else:
+            batch.append((index, record))
+        index += 1
+        
+        if len(batch) >= settings.sales_bulk_batch_size:
+            results.extend(await _ingest_sale_batch(user_id, batch))
+            batch = []
+    
+    if batch:
+        results.extend(await _ingest_sale_batch(user_id, batch))
+    
+    results.sort(key=lambda outcome: outcome.index)
+    created = sum(outcome.status == "created" for outcome in results)
+    if created:
+        await get_response_cache().invalidate(user_id, "sales", "products")
+        background_tasks.add_task(refresh_segments_if_due, user_id)
+    
+    return SaleBulkResponse(
+        created=created,
+        duplicates=sum(outcome.status == "duplicate" for outcome in results),
+        rejected=sum(outcome.status == "rejected" for outcome in results),
+        results=results
     )
 
 
@@ -99,70 +409,30 @@ async def list_sales(
 
 
 @router.get("/analytics", response_model=SalesAnalytics)
+@cached_response("sales.analytics", ("sales",))
 async def get_sales_analytics(
     user_id: str = Depends(get_current_user_id),
     days: int = Query(30, ge=1, le=365)
 ):
-    sales_collection = get_collection("sales")
-    products_collection = get_collection("products")
+    analytics_collection = get_collection(ANALYTICS_ROLLUPS_COLLECTION)
     
     period_start = datetime.utcnow() - timedelta(days=days)
     period_end = datetime.utcnow()
     
-    query = {
-        "user_id": ObjectId(user_id),
-        "sale_date": {"$gte": period_start, "$lte": period_end}
-    }
+    facets = await analytics_collection.aggregate(
+        sales_analytics_pipeline(user_id, period_start, period_end)
+    ).to_list(length=1)
+    facets = facets[0]
+    
+    totals = facets["totals"][0] if facets["totals"] else {"total_sales": 0, "total_revenue": 0, "total_cost": 0}
+    total_sales = totals["total_sales"]
+    total_revenue = totals["total_revenue"]
+    total_cost = totals["total_cost"]
+    
+    category_sales = {category["_id"]: category["revenue"] for category in facets["categories"]}
     
-    sales = await sales_collection.find(query).to_list(length=None)
-    
-    total_sales = len(sales)
-    total_revenue = sum(sale["total_amount"] for sale in sales)
-    
-    product_sales = {}
-    category_sales = {}
-    total_cost = 0
-    
-    for sale in sales:
-        for item in sale["items"]:
-            product_id = item["product_id"]
-            if product_id not in product_sales:
-                product_sales[product_id] = {
-                    "product_name": item["product_name"],
-                    "quantity": 0,
-                    "revenue": 0
-                }
-            product_sales[product_id]["quantity"] += item["quantity"]
-            product_sales[product_id]["revenue"] += item["total_price"]
-            
-            product = await products_collection.find_one({"_id": ObjectId(product_id)})
-            if product:
-                total_cost += product["cost_price"] * item["quantity"]
-                category = product.get("category", "Uncategorized")
-                category_sales[category] = category_sales.get(category, 0) + item["total_price"]
-    
-    top_products = sorted(
-        [
-            {"product_id": pid, **data}
-            for pid, data in product_sales.items()
-        ],
-        key=lambda x: x["revenue"],
-        reverse=True
-    )[:10]
-    
-    sales_trend = []
-    for i in range(days):
-        day_start = period_start + timedelta(days=i)
-        day_end = day_start + timedelta(days=1)
-        day_sales = [
-            sale for sale in sales
-            if day_start <= sale["sale_date"] < day_end
-        ]
-        sales_trend.append({
-            "date": day_start.strftime("%Y-%m-%d"),
-            "sales": len(day_sales),
-            "revenue": sum(sale["total_amount"] for sale in day_sales)
-        })
+    top_products = facets["top_products"]
+    sales_trend = daily_trend(facets["trend"], period_start, days)
     
     total_profit = total_revenue - total_cost
     average_order_value = total_revenue / total_sales if total_sales > 0 else 0
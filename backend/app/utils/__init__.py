@@ -6,6 +6,7 @@ from app.utils.auth import (
     verify_token,
     get_current_user_id,
 )
+from app.utils.streaming import wants_ndjson, ndjson_response, sends_ndjson, ndjson_lines
 
 __all__ = [
     "verify_password",
@@ -14,4 +15,8 @@ __all__ = [
     "create_refresh_token",
     "verify_token",
     "get_current_user_id",
+    "wants_ndjson",
+    "ndjson_response",
+    "sends_ndjson",
+    "ndjson_lines",
 ]
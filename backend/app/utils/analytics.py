@@ -0,0 +1,113 @@
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from bson import ObjectId
+
+from app.utils.rollups import ROLLUP_SCOPES, rollup_bucket
+
+
+DAY_MS = 24 * 3600 * 1000
+TOP_PRODUCTS_LIMIT = 10
+
+
+def rollup_window(period_start: datetime, period_end: datetime) -> List[Dict]:
+    start_hour = rollup_bucket(period_start, "hour")
+    first_day = rollup_bucket(start_hour + timedelta(days=1) - timedelta(hours=1), "day")
+    last_day = rollup_bucket(period_end, "day")
+
+    if first_day >= last_day:
+        return [{"granularity": "hour", "bucket": {"$gte": start_hour, "$lte": period_end}}]
+
+    # Whole days come from daily buckets, the partial days at either end
+    # from hourly ones.
+    return [
+        {"granularity": "day", "bucket": {"$gte": first_day, "$lt": last_day}},
+        {"granularity": "hour", "bucket": {"$gte": start_hour, "$lt": first_day}},
+        {"granularity": "hour", "bucket": {"$gte": last_day, "$lte": period_end}}
+    ]
+
+
+def sales_analytics_pipeline(user_id: str, period_start: datetime, period_end: datetime) -> List[Dict]:
+    start_hour = rollup_bucket(period_start, "hour")
+    windows = {
+        scope: [{"scope": scope, **clause} for clause in rollup_window(period_start, period_end)]
+        for scope in ROLLUP_SCOPES
+    }
+    trend = {"scope": "tenant", "granularity": "hour", "bucket": {"$gte": start_hour, "$lte": period_end}}
+
+    # Every branch is spelled out with its scope so the index on
+    # (user_id, scope, granularity, bucket) bounds what is read.
+    return [
+        {
+            "$match": {
+                "user_id": ObjectId(user_id),
+                "$or": [clause for clauses in windows.values() for clause in clauses] + [trend]
+            }
+        },
+        {
+            "$facet": {
+                "totals": [
+                    {"$match": {"$or": windows["tenant"]}},
+                    {
+                        "$group": {
+                            "_id": None,
+                            "total_sales": {"$sum": "$count"},
+                            "total_revenue": {"$sum": "$revenue"},
+                            "total_cost": {"$sum": "$cost"}
+                        }
+                    }
+                ],
+                "top_products": [
+                    {"$match": {"$or": windows["product"]}},
+                    {
+                        "$group": {
+                            "_id": "$key",
+                            "product_name": {"$max": "$product_name"},
+                            "quantity": {"$sum": "$quantity"},
+                            "revenue": {"$sum": "$revenue"}
+                        }
+                    },
+                    {"$sort": {"revenue": -1}},
+                    {"$limit": TOP_PRODUCTS_LIMIT},
+                    {
+                        "$project": {
+                            "_id": 0,
+                            "product_id": "$_id",
+                            "product_name": 1,
+                            "quantity": 1,
+                            "revenue": 1
+                        }
+                    }
+                ],
+                "categories": [
+                    {"$match": {"$or": windows["category"]}},
+                    {"$group": {"_id": "$key", "revenue": {"$sum": "$revenue"}}}
+                ],
+                # Trend days are offset from period_start, so they are built
+                # from hourly buckets.
+                "trend": [
+                    {"$match": trend},
+                    {
+                        "$group": {
+                            "_id": {"$floor": {"$divide": [{"$subtract": ["$bucket", start_hour]}, DAY_MS]}},
+                            "sales": {"$sum": "$count"},
+                            "revenue": {"$sum": "$revenue"}
+                        }
+                    }
+                ]
+            }
+        }
+    ]
+
+
+def daily_trend(buckets: List[Dict], period_start: datetime, days: int) -> List[Dict]:
+    by_day = {int(bucket["_id"]): bucket for bucket in buckets}
+
+    return [
+        {
+            "date": (period_start + timedelta(days=i)).strftime("%Y-%m-%d"),
+            "sales": by_day.get(i, {}).get("sales", 0),
+            "revenue": by_day.get(i, {}).get("revenue", 0)
+        }
+        for i in range(days)
+    ]
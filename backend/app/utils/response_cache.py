@@ -0,0 +1,182 @@
+import functools
+import hashlib
+import json
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from fastapi.encoders import jsonable_encoder
+
+from app.config import settings
+
+
+KEY_PREFIX = "response_cache"
+
+# Data a cached response can depend on. Writes bump the version of what
+# they touch, which moves every dependent entry to a new key.
+CACHE_SCOPES = ("products", "sales")
+
+
+def new_version() -> str:
+    # Versions are random rather than counters, so a version key that is
+    # evicted and recreated never matches entries cached under an old one.
+    return uuid.uuid4().hex[:12]
+
+
+class MemoryCacheStore:
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._versions: "OrderedDict[str, str]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: str, ttl_seconds: int) -> None:
+        self._entries[key] = (time.monotonic() + ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def versions(self, keys: Sequence[str]) -> List[str]:
+        versions = [self._versions.setdefault(key, new_version()) for key in keys]
+        self._touch_versions(keys)
+        return versions
+
+    async def bump(self, keys: Sequence[str]) -> None:
+        for key in keys:
+            self._versions[key] = new_version()
+        self._touch_versions(keys)
+
+    def _touch_versions(self, keys: Sequence[str]) -> None:
+        # An evicted version comes back as a fresh token, which only turns
+        # that tenant's entries into misses.
+        for key in keys:
+            self._versions.move_to_end(key)
+        while len(self._versions) > self.max_entries:
+            self._versions.popitem(last=False)
+
+
+class RedisCacheStore:
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url, decode_responses=True)
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._redis.get(key)
+
+    async def set(self, key: str, value: str, ttl_seconds: int) -> None:
+        # LRU eviction is the server's maxmemory-policy.
+        await self._redis.set(key, value, ex=ttl_seconds)
+
+    async def versions(self, keys: Sequence[str]) -> List[str]:
+        values = await self._redis.mget(keys)
+        missing = [key for key, value in zip(keys, values) if value is None]
+        if not missing:
+            return values
+
+        # A missing key (never set, or evicted) gets a fresh token; NX keeps
+        # concurrent workers on the same one.
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for key in missing:
+                pipe.set(key, new_version(), nx=True)
+            await pipe.execute()
+        return await self._redis.mget(keys)
+
+    async def bump(self, keys: Sequence[str]) -> None:
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.set(key, new_version())
+            await pipe.execute()
+
+
+class ResponseCache:
+    def __init__(self, store, ttl_seconds: int = 300):
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def version_key(user_id: str, scope: str) -> str:
+        return f"{KEY_PREFIX}:version:{user_id}:{scope}"
+
+    async def entry_key(self, user_id: str, endpoint: str, params: Dict, scopes: Iterable[str]) -> str:
+        scopes = sorted(scopes)
+        versions = await self.store.versions([self.version_key(user_id, scope) for scope in scopes])
+        digest = hashlib.sha1(
+            json.dumps(jsonable_encoder(params), sort_keys=True).encode()
+        ).hexdigest()
+        version = ".".join(f"{scope}-{v}" for scope, v in zip(scopes, versions))
+        return f"{KEY_PREFIX}:{user_id}:{endpoint}:{version}:{digest}"
+
+    async def get_or_compute(self, user_id: str, endpoint: str, params: Dict, scopes: Iterable[str], compute):
+        try:
+            key = await self.entry_key(user_id, endpoint, params, scopes)
+            cached = await self.store.get(key)
+        except Exception as e:
+            print(f"Response cache unavailable, computing {endpoint}: {e}")
+            return await compute()
+
+        if cached is not None:
+            self.hits += 1
+            return json.loads(cached)
+
+        self.misses += 1
+        result = jsonable_encoder(await compute())
+        try:
+            await self.store.set(key, json.dumps(result), self.ttl_seconds)
+        except Exception as e:
+            print(f"Failed to cache {endpoint}: {e}")
+        return result
+
+    async def invalidate(self, user_id: str, *scopes: str) -> None:
+        try:
+            await self.store.bump([self.version_key(user_id, scope) for scope in scopes or CACHE_SCOPES])
+        except Exception as e:
+            print(f"Failed to invalidate cached responses for tenant {user_id}: {e}")
+
+
+def cached_response(endpoint: str, scopes: Sequence[str]):
+    def decorator(route):
+        @functools.wraps(route)
+        async def wrapper(*args, **kwargs):
+            user_id = kwargs["user_id"]
+            params = {name: value for name, value in kwargs.items() if name != "user_id"}
+            return await get_response_cache().get_or_compute(
+                user_id, endpoint, params, scopes, lambda: route(*args, **kwargs)
+            )
+        return wrapper
+    return decorator
+
+
+_response_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    global _response_cache
+    if _response_cache is None:
+        store = None
+        if settings.response_cache_backend == "redis":
+            try:
+                store = RedisCacheStore(settings.response_cache_url)
+            except ImportError:
+                print("redis not installed, using the in-process response cache")
+
+        _response_cache = ResponseCache(
+            store or MemoryCacheStore(settings.response_cache_max_entries),
+            settings.response_cache_ttl_seconds
+        )
+    return _response_cache
@@ -0,0 +1,321 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+
+DAILY_ROLLUPS_COLLECTION = "product_daily_sales"
+ANALYTICS_ROLLUPS_COLLECTION = "sales_rollups"
+
+ROLLUP_GRANULARITIES = ("hour", "day")
+ROLLUP_SCOPES = ("tenant", "product", "category")
+UNCATEGORIZED = "Uncategorized"
+
+
+def sale_day(sale_date: datetime) -> datetime:
+    return datetime(sale_date.year, sale_date.month, sale_date.day)
+
+
+async def ensure_rollup_indexes(db) -> None:
+    # Concurrent $inc upserts only stay one-row-per-bucket with these in place.
+    await db[DAILY_ROLLUPS_COLLECTION].create_index(
+        [("user_id", 1), ("product_id", 1), ("day", 1)],
+        unique=True
+    )
+    await db[DAILY_ROLLUPS_COLLECTION].create_index([("user_id", 1), ("day", 1)])
+    await db[ANALYTICS_ROLLUPS_COLLECTION].create_index(
+        [("user_id", 1), ("granularity", 1), ("scope", 1), ("key", 1), ("bucket", 1)],
+        unique=True
+    )
+    await db[ANALYTICS_ROLLUPS_COLLECTION].create_index(
+        [("user_id", 1), ("scope", 1), ("granularity", 1), ("bucket", 1)]
+    )
+
+
+def rollup_bucket(sale_date: datetime, granularity: str) -> datetime:
+    if granularity == "hour":
+        return datetime(sale_date.year, sale_date.month, sale_date.day, sale_date.hour)
+    return sale_day(sale_date)
+
+
+def daily_rollup_updates(
+    user_id: str,
+    sale_id: ObjectId,
+    sale_date: datetime,
+    items: List[Dict],
+    cost_prices: Dict[str, float]
+) -> List[UpdateOne]:
+    day = sale_day(sale_date)
+    per_product: Dict[str, Dict] = {}
+
+    for item in items:
+        product_id = item["product_id"]
+        totals = per_product.setdefault(product_id, {
+            "product_name": item["product_name"],
+            "quantity": 0,
+            "revenue": 0.0,
+            "cost": 0.0,
+            "order_count": 0
+        })
+        totals["quantity"] += item["quantity"]
+        totals["revenue"] += item["total_price"]
+        totals["cost"] += cost_prices.get(product_id, 0) * item["quantity"]
+        totals["order_count"] += 1
+
+    return [
+        UpdateOne(
+            {"user_id": ObjectId(user_id), "product_id": product_id, "day": day},
+            {
+                "$inc": {
+                    "quantity": totals["quantity"],
+                    "revenue": totals["revenue"],
+                    "cost": totals["cost"],
+                    "order_count": totals["order_count"]
+                },
+                "$max": {"last_sale_id": sale_id},
+                "$set": {
+                    "product_name": totals["product_name"],
+                    "updated_at": datetime.utcnow()
+                }
+            },
+            upsert=True
+        )
+        for product_id, totals in per_product.items()
+    ]
+
+
+def rollup_watermark(rollups: List[Dict]) -> str:
+    if not rollups:
+        return "empty"
+
+    last_sale_id = max(str(doc.get("last_sale_id", "")) for doc in rollups)
+    total_quantity = sum(doc.get("quantity", 0) for doc in rollups)
+    return f"{len(rollups)}:{last_sale_id}:{total_quantity}"
+
+
+def daily_rollup_rebuild_pipeline(user_id: Optional[str] = None) -> List[Dict]:
+    match = {"user_id": ObjectId(user_id)} if user_id else {}
+
+    return [
+        {"$match": match},
+        {"$unwind": "$items"},
+        {
+            "$lookup": {
+                "from": "products",
+                "let": {"pid": "$items.product_id"},
+                "pipeline": [
+                    {"$match": {"$expr": {"$eq": ["$_id", {"$toObjectId": "$$pid"}]}}},
+                    {"$project": {"cost_price": 1}}
+                ],
+                "as": "product"
+            }
+        },
+        {
+            "$group": {
+                "_id": {
+                    "user_id": "$user_id",
+                    "product_id": "$items.product_id",
+                    "day": {"$dateTrunc": {"date": "$sale_date", "unit": "day"}}
+                },
+                "product_name": {"$last": "$items.product_name"},
+                "quantity": {"$sum": "$items.quantity"},
+                "revenue": {"$sum": "$items.total_price"},
+                "cost": {
+                    "$sum": {
+                        "$multiply": [
+                            "$items.quantity",
+                            {"$ifNull": [{"$first": "$product.cost_price"}, 0]}
+                        ]
+                    }
+                },
+                "order_count": {"$sum": 1},
+                "last_sale_id": {"$max": "$_id"}
+            }
+        },
+        {
+            "$project": {
+                "_id": 0,
+                "user_id": "$_id.user_id",
+                "product_id": "$_id.product_id",
+                "day": "$_id.day",
+                "product_name": 1,
+                "quantity": 1,
+                "revenue": 1,
+                "cost": 1,
+                "order_count": 1,
+                "last_sale_id": 1,
+                "updated_at": "$$NOW"
+            }
+        },
+        {
+            "$merge": {
+                "into": DAILY_ROLLUPS_COLLECTION,
+                "on": ["user_id", "product_id", "day"],
+                "whenMatched": "replace",
+                "whenNotMatched": "insert"
+            }
+        }
+    ]
+
+
+def analytics_rollup_updates(user_id: str, sales: List[Dict], products: Dict[str, Dict]) -> List[UpdateOne]:
+    buckets: Dict[tuple, Dict] = {}
+
+    def add(granularity, scope, key, sale_date, count, quantity, revenue, cost, product_name=None):
+        totals = buckets.setdefault(
+            (granularity, scope, key, rollup_bucket(sale_date, granularity)),
+            {"count": 0, "quantity": 0, "revenue": 0.0, "cost": 0.0, "product_name": product_name}
+        )
+        totals["count"] += count
+        totals["quantity"] += quantity
+        totals["revenue"] += revenue
+        totals["cost"] += cost
+
+    for sale in sales:
+        sale_cost = 0.0
+        for item in sale["items"]:
+            product = products.get(item["product_id"], {})
+            cost = product.get("cost_price", 0) * item["quantity"]
+            sale_cost += cost
+
+            for granularity in ROLLUP_GRANULARITIES:
+                add(granularity, "product", item["product_id"], sale["sale_date"], 1,
+                    item["quantity"], item["total_price"], cost, item["product_name"])
+                if product:
+                    add(granularity, "category", product.get("category") or UNCATEGORIZED, sale["sale_date"], 1,
+                        item["quantity"], item["total_price"], cost)
+
+        quantity = sum(item["quantity"] for item in sale["items"])
+        for granularity in ROLLUP_GRANULARITIES:
+            add(granularity, "tenant", "", sale["sale_date"], 1, quantity, sale["total_amount"], sale_cost)
+
+    now = datetime.utcnow()
+    updates = []
+    for (granularity, scope, key, bucket), totals in buckets.items():
+        update = {
+            "$inc": {
+                "count": totals["count"],
+                "quantity": totals["quantity"],
+                "revenue": totals["revenue"],
+                "cost": totals["cost"],
+                "profit": totals["revenue"] - totals["cost"]
+            },
+            "$set": {"updated_at": now}
+        }
+        if totals["product_name"] is not None:
+            update["$set"]["product_name"] = totals["product_name"]
+
+        updates.append(UpdateOne(
+            {
+                "user_id": ObjectId(user_id),
+                "granularity": granularity,
+                "scope": scope,
+                "key": key,
+                "bucket": bucket
+            },
+            update,
+            upsert=True
+        ))
+
+    return updates
+
+
+def analytics_rollup_rebuild_pipeline(granularity: str, scope: str, user_id: Optional[str] = None) -> List[Dict]:
+    match = {"user_id": ObjectId(user_id)} if user_id else {}
+    bucket = {"$dateTrunc": {"date": "$sale_date", "unit": granularity}}
+
+    pipeline = [
+        {"$match": match},
+        {"$unwind": "$items"},
+        {
+            "$lookup": {
+                "from": "products",
+                "let": {"pid": "$items.product_id"},
+                "pipeline": [
+                    {"$match": {"$expr": {"$eq": ["$_id", {"$toObjectId": "$$pid"}]}}},
+                    {"$project": {"cost_price": 1, "category": 1}}
+                ],
+                "as": "product"
+            }
+        },
+        {
+            "$addFields": {
+                "line_cost": {
+                    "$multiply": [
+                        "$items.quantity",
+                        {"$ifNull": [{"$first": "$product.cost_price"}, 0]}
+                    ]
+                }
+            }
+        }
+    ]
+
+    if scope == "tenant":
+        pipeline += [
+            {
+                "$group": {
+                    "_id": "$_id",
+                    "user_id": {"$first": "$user_id"},
+                    "sale_date": {"$first": "$sale_date"},
+                    "total_amount": {"$first": "$total_amount"},
+                    "quantity": {"$sum": "$items.quantity"},
+                    "cost": {"$sum": "$line_cost"}
+                }
+            },
+            {
+                "$group": {
+                    "_id": {"user_id": "$user_id", "key": "", "bucket": bucket},
+                    "count": {"$sum": 1},
+                    "quantity": {"$sum": "$quantity"},
+                    "revenue": {"$sum": "$total_amount"},
+                    "cost": {"$sum": "$cost"}
+                }
+            }
+        ]
+    else:
+        if scope == "category":
+            key = {"$ifNull": [{"$first": "$product.category"}, UNCATEGORIZED]}
+            # Like live writes, lines whose product is gone have no category.
+            pipeline.append({"$match": {"product.0": {"$exists": True}}})
+        else:
+            key = "$items.product_id"
+
+        pipeline.append({
+            "$group": {
+                "_id": {"user_id": "$user_id", "key": key, "bucket": bucket},
+                "count": {"$sum": 1},
+                "quantity": {"$sum": "$items.quantity"},
+                "revenue": {"$sum": "$items.total_price"},
+                "cost": {"$sum": "$line_cost"},
+                **({"product_name": {"$last": "$items.product_name"}} if scope == "product" else {})
+            }
+        })
+
+    return pipeline + [
+        {
+            "$project": {
+                "_id": 0,
+                "user_id": "$_id.user_id",
+                "granularity": {"$literal": granularity},
+                "scope": {"$literal": scope},
+                "key": "$_id.key",
+                "bucket": "$_id.bucket",
+                **({"product_name": 1} if scope == "product" else {}),
+                "count": 1,
+                "quantity": 1,
+                "revenue": 1,
+                "cost": 1,
+                "profit": {"$subtract": ["$revenue", "$cost"]},
+                "updated_at": "$$NOW"
+            }
+        },
+        {
+            "$merge": {
+                "into": ANALYTICS_ROLLUPS_COLLECTION,
+                "on": ["user_id", "granularity", "scope", "key", "bucket"],
+                "whenMatched": "replace",
+                "whenNotMatched": "insert"
+            }
+        }
+    ]
@@ -0,0 +1,164 @@
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
+
+from app.database import get_collection, get_database
+
+
+# Server error codes for transactions on a standalone mongod and for a
+# unique index violation.
+ILLEGAL_OPERATION = 20
+DUPLICATE_KEY = 11000
+
+# Without transactions, decremented products are tagged with the write that
+# took the stock so a failed write gives back exactly what it took. The
+# write itself must leave nothing behind when it raises.
+PENDING_WRITES_FIELD = "pending_stock_writes"
+
+
+class InsufficientStockError(Exception):
+    pass
+
+
+def stock_demand(items: List[Dict]) -> Dict[str, int]:
+    demand: Dict[str, int] = {}
+    for item in items:
+        demand[item["product_id"]] = demand.get(item["product_id"], 0) + item["quantity"]
+    return demand
+
+
+def stock_decrements(
+    user_id: str,
+    demand: Dict[str, int],
+    marker: Optional[ObjectId] = None
+) -> List[UpdateOne]:
+    now = datetime.utcnow()
+    updates = []
+
+    for product_id, quantity in demand.items():
+        update = {
+            "$inc": {"quantity": -quantity},
+            "$set": {"updated_at": now}
+        }
+        if marker is not None:
+            update["$addToSet"] = {PENDING_WRITES_FIELD: marker}
+
+        updates.append(UpdateOne(
+            {
+                "_id": ObjectId(product_id),
+                "user_id": ObjectId(user_id),
+                "quantity": {"$gte": quantity}
+            },
+            update
+        ))
+
+    return updates
+
+
+def stock_reversals(user_id: str, demand: Dict[str, int], marker: ObjectId) -> List[UpdateOne]:
+    return [
+        UpdateOne(
+            {
+                "_id": ObjectId(product_id),
+                "user_id": ObjectId(user_id),
+                PENDING_WRITES_FIELD: marker
+            },
+            {
+                "$inc": {"quantity": quantity},
+                "$pull": {PENDING_WRITES_FIELD: marker}
+            }
+        )
+        for product_id, quantity in demand.items()
+    ]
+
+
+_transactions_supported: Optional[bool] = None
+
+
+async def apply_stock_changes(
+    user_id: str,
+    demand: Dict[str, int],
+    write: Callable[[Optional[object]], Awaitable],
+    write_derived: Optional[Callable[[Optional[object]], Awaitable]] = None
+):
+    global _transactions_supported
+
+    if _transactions_supported is not False:
+        try:
+            return await _apply_in_transaction(user_id, demand, write, write_derived)
+        except OperationFailure as e:
+            if e.code != ILLEGAL_OPERATION:
+                raise
+            print("MongoDB transactions unavailable, using compensating stock updates")
+            _transactions_supported = False
+
+    return await _apply_with_compensation(user_id, demand, write, write_derived)
+
+
+async def _apply_in_transaction(user_id: str, demand: Dict[str, int], write, write_derived):
+    products_collection = get_collection("products")
+
+    async def run(session):
+        global _transactions_supported
+        # A sale without items takes no stock, and bulk_write rejects an
+        # empty list.
+        if demand:
+            result = await products_collection.bulk_write(
+                stock_decrements(user_id, demand),
+                ordered=False,
+                session=session
+            )
+            _transactions_supported = True
+
+            # Raising aborts the transaction; write conflicts with concurrent
+            # sales are retried by with_transaction.
+            if result.matched_count < len(demand):
+                raise InsufficientStockError()
+        written = await write(session)
+        if write_derived is not None:
+            await write_derived(session)
+        return written
+
+    async with await get_database().client.start_session() as session:
+        return await session.with_transaction(run)
+
+
+async def _apply_with_compensation(user_id: str, demand: Dict[str, int], write, write_derived):
+    products_collection = get_collection("products")
+    marker = ObjectId()
+
+    if demand:
+        result = await products_collection.bulk_write(
+            stock_decrements(user_id, demand, marker),
+            ordered=False
+        )
+
+        if result.matched_count < len(demand):
+            await products_collection.bulk_write(stock_reversals(user_id, demand, marker), ordered=False)
+            raise InsufficientStockError()
+
+    try:
+        written = await write(None)
+    except Exception:
+        if demand:
+            await products_collection.bulk_write(stock_reversals(user_id, demand, marker), ordered=False)
+        raise
+
+    if demand:
+        await products_collection.update_many(
+            {"_id": {"$in": [ObjectId(pid) for pid in demand]}, PENDING_WRITES_FIELD: marker},
+            {"$pull": {PENDING_WRITES_FIELD: marker}}
+        )
+
+    # Rollups are only touched once the records and stock are final, so a
+    # failed write never leaves counts behind. A failure here leaves them
+    # short until backfill_rollups.py rebuilds them.
+    if write_derived is not None:
+        try:
+            await write_derived(None)
+        except Exception as e:
+            print(f"Rollup update failed for tenant {user_id}, rebuild with backfill_rollups.py: {e}")
+    return written
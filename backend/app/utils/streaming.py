@@ -0,0 +1,42 @@
+import json
+from typing import AsyncIterator, Dict
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def ndjson_response(lines: AsyncIterator[Dict]) -> StreamingResponse:
+    async def encode():
+        async for line in lines:
+            yield json.dumps(jsonable_encoder(line)) + "\n"
+
+    return StreamingResponse(
+        encode(),
+        media_type=NDJSON_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def sends_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("content-type", "")
+
+
+async def ndjson_lines(request: Request) -> AsyncIterator[bytes]:
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+
+    if buffer.strip():
+        yield buffer
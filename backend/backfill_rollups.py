@@ -0,0 +1,65 @@
+import asyncio
+import sys
+from motor.motor_asyncio import AsyncIOMotorClient
+from bson import ObjectId
+import os
+from dotenv import load_dotenv
+
+from app.utils.rollups import (
+    ANALYTICS_ROLLUPS_COLLECTION,
+    DAILY_ROLLUPS_COLLECTION,
+    ROLLUP_GRANULARITIES,
+    ROLLUP_SCOPES,
+    analytics_rollup_rebuild_pipeline,
+    daily_rollup_rebuild_pipeline,
+    ensure_rollup_indexes,
+)
+
+load_dotenv()
+
+MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
+DATABASE_NAME = os.getenv("DATABASE_NAME", "retail_assistant")
+
+
+async def backfill_rollups(user_id=None):
+    client = AsyncIOMotorClient(MONGODB_URL)
+    db = client[DATABASE_NAME]
+    rollups_collection = db[DAILY_ROLLUPS_COLLECTION]
+    
+    print(f"Connecting to MongoDB at {MONGODB_URL}")
+    print(f"Database: {DATABASE_NAME}")
+    
+    await ensure_rollup_indexes(db)
+    
+    scope = f"user {user_id}" if user_id else "all users"
+    print(f"Rebuilding daily product sales rollups for {scope}...")
+    
+    await db["sales"].aggregate(daily_rollup_rebuild_pipeline(user_id)).to_list(length=None)
+    
+    query = {"user_id": ObjectId(user_id)} if user_id else {}
+    total = await rollups_collection.count_documents(query)
+    print(f"\n{DAILY_ROLLUPS_COLLECTION} now holds {total} rollup documents")
+    
+    await backfill_analytics_rollups(db, user_id)
+    
+    client.close()
+    print("\nRollup backfill completed successfully!")
+
+
+async def backfill_analytics_rollups(db, user_id=None):
+    analytics_collection = db[ANALYTICS_ROLLUPS_COLLECTION]
+    
+    for granularity in ROLLUP_GRANULARITIES:
+        for scope in ROLLUP_SCOPES:
+            print(f"Rebuilding {granularity}ly {scope} analytics rollups...")
+            await db["sales"].aggregate(
+                analytics_rollup_rebuild_pipeline(granularity, scope, user_id)
+            ).to_list(length=None)
+    
+    query = {"user_id": ObjectId(user_id)} if user_id else {}
+    total = await analytics_collection.count_documents(query)
+    print(f"\n{ANALYTICS_ROLLUPS_COLLECTION} now holds {total} rollup documents")
+
+
+if __name__ == "__main__":
+    asyncio.run(backfill_rollups(sys.argv[1] if len(sys.argv) > 1 else None))
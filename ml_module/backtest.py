@@ -0,0 +1,299 @@
+import argparse
+import importlib.util
+import os
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+# The production smoothing models live in the backend package. The module
+# only needs numpy, so it is loaded by path rather than through app.ml,
+# whose __init__ pulls in the web service's dependencies.
+SMOOTHING_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "backend", "app", "ml", "smoothing.py"
+)
+
+SEASON_LENGTH = 7
+
+_smoothing = None
+
+
+def load_smoothing():
+    global _smoothing
+    if _smoothing is None:
+        spec = importlib.util.spec_from_file_location("backend_smoothing", SMOOTHING_PATH)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _smoothing = module
+    return _smoothing
+
+
+class MeanBackend:
+    def fit(self, train):
+        self.level = float(train["y"].mean())
+
+    def predict(self, future):
+        return np.full(len(future), self.level)
+
+
+class SeasonalNaiveBackend:
+    def fit(self, train):
+        self.last_season = train["y"].to_numpy()[-SEASON_LENGTH:]
+
+    def predict(self, future):
+        return np.resize(self.last_season, len(future))
+
+
+class ProphetBackend:
+    def fit(self, train):
+        from prophet import Prophet
+
+        self.model = Prophet(
+            daily_seasonality=False,
+            weekly_seasonality=True,
+            yearly_seasonality=len(train) >= 365,
+            changepoint_prior_scale=0.05
+        )
+        self.model.add_regressor("is_holiday")
+        self.model.fit(train[["ds", "y", "is_holiday"]])
+
+    def predict(self, future):
+        return self.model.predict(future[["ds", "is_holiday"]])["yhat"].to_numpy()
+
+
+class SmoothingBackend:
+    def __init__(self, method):
+        self.method = method
+
+    def fit(self, train):
+        self.y = train["y"].to_numpy(dtype=float)
+        self.forecast = None
+
+    def predict(self, future):
+        smoothing_forecast = load_smoothing().smoothing_forecast
+
+        # Parameter search and forecasting happen in one call, so for these
+        # models predict time includes estimation.
+        steps = np.arange(1, len(future) + 1)
+        return smoothing_forecast(self.y, steps, self.method)["yhat"]
+
+
+def available_backends():
+    # Only per-product models are compared. The global RandomForest and the
+    # hierarchical modes forecast a whole catalog from one fit, so a fold
+    # would need every product's history at the same cutoff (and category
+    # labels) rather than one series.
+    backends = {
+        "mean": MeanBackend,
+        "seasonal_naive": SeasonalNaiveBackend
+    }
+
+    try:
+        import prophet  # noqa: F401
+        backends["prophet"] = ProphetBackend
+    except ImportError:
+        print("Prophet not installed, skipping prophet backend")
+
+    if os.path.exists(SMOOTHING_PATH):
+        for method in load_smoothing().SMOOTHING_METHODS:
+            backends[method] = lambda method=method: SmoothingBackend(method)
+    else:
+        print(f"Backend smoothing models not found at {SMOOTHING_PATH}, skipping them")
+
+    return backends
+
+
+def generate_product_panel(n_products=20, days=365, seed=42):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(end=pd.Timestamp.today().normalize(), periods=days, freq="D")
+    t = np.arange(days)
+
+    frames = []
+    for i in range(n_products):
+        level = rng.uniform(2, 60)
+        weekly = rng.uniform(0, 0.3) * level * np.sin(2 * np.pi * t / 7 + rng.uniform(0, 2 * np.pi))
+        trend = rng.uniform(-0.3, 0.6) * level * t / days
+        demand = rng.poisson(np.maximum(level + weekly + trend, 0.1)).astype(float)
+
+        # Every fourth product sells only occasionally.
+        if i % 4 == 3:
+            demand *= rng.random(days) < 0.2
+
+        frames.append(pd.DataFrame({
+            "product_id": f"product_{i:03d}",
+            "ds": dates,
+            "y": demand,
+            "is_holiday": 0
+        }))
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_panel(path):
+    df = pd.read_csv(path, parse_dates=["ds"])
+    if "product_id" not in df.columns:
+        df["product_id"] = "product_000"
+    if "is_holiday" not in df.columns:
+        df["is_holiday"] = 0
+
+    # Days without sales are zero demand, not missing.
+    frames = []
+    for product_id, group in df.groupby("product_id"):
+        daily = group.groupby("ds").agg(y=("y", "sum"), is_holiday=("is_holiday", "max"))
+        daily = daily.reindex(pd.date_range(daily.index.min(), daily.index.max(), freq="D"), fill_value=0)
+        frames.append(daily.rename_axis("ds").reset_index().assign(product_id=product_id))
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def forecast_metrics(train_y, actual, predicted):
+    errors = actual - predicted
+    nonzero = actual != 0
+
+    lag = SEASON_LENGTH if len(train_y) > SEASON_LENGTH else 1
+    scale = np.mean(np.abs(train_y[lag:] - train_y[:-lag])) if len(train_y) > lag else np.nan
+
+    return {
+        "mae": float(np.mean(np.abs(errors))),
+        "rmse": float(np.sqrt(np.mean(errors ** 2))),
+        "mape": float(np.mean(np.abs(errors[nonzero] / actual[nonzero])) * 100) if nonzero.any() else np.nan,
+        "mase": float(np.mean(np.abs(errors)) / scale) if scale and scale > 0 else np.nan
+    }
+
+
+def timed(fn, *args):
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        result = fn(*args)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, elapsed * 1000, peak / (1024 * 1024)
+
+
+def backtest_product(backend_name, product_id, df, horizon, n_origins, step, min_train):
+    backend_factory = available_backends()[backend_name]
+    df = df.sort_values("ds").reset_index(drop=True)
+    rows = []
+
+    last_cutoff = len(df) - horizon
+    cutoffs = [last_cutoff - i * step for i in range(n_origins)]
+
+    for cutoff in sorted(c for c in cutoffs if c >= min_train):
+        train = df.iloc[:cutoff]
+        test = df.iloc[cutoff:cutoff + horizon]
+        backend = backend_factory()
+
+        row = {"backend": backend_name, "product_id": product_id, "cutoff": train["ds"].iloc[-1]}
+        try:
+            _, fit_ms, fit_mb = timed(backend.fit, train)
+            predicted, predict_ms, predict_mb = timed(backend.predict, test)
+        except Exception as e:
+            row["error"] = str(e)
+            rows.append(row)
+            continue
+
+        row.update(forecast_metrics(
+            train["y"].to_numpy(dtype=float),
+            test["y"].to_numpy(dtype=float),
+            np.maximum(np.asarray(predicted, dtype=float), 0)
+        ))
+        row.update({
+            "fit_ms": fit_ms,
+            "predict_ms": predict_ms,
+            "peak_mb": max(fit_mb, predict_mb)
+        })
+        rows.append(row)
+
+    return rows
+
+
+def summarize(folds):
+    ok = folds[folds["error"].isna()] if "error" in folds.columns else folds
+
+    summary = ok.groupby("backend").agg(
+        folds=("mae", "size"),
+        products=("product_id", "nunique"),
+        mae=("mae", "mean"),
+        rmse=("rmse", "mean"),
+        mape=("mape", "mean"),
+        mase=("mase", "mean"),
+        fit_ms_mean=("fit_ms", "mean"),
+        fit_ms_p90=("fit_ms", lambda s: s.quantile(0.9)),
+        predict_ms_mean=("predict_ms", "mean"),
+        peak_mb_max=("peak_mb", "max")
+    )
+
+    if "error" in folds.columns:
+        summary["errors"] = folds.groupby("backend")["error"].count().reindex(summary.index).fillna(0).astype(int)
+
+    return summary.sort_values("mase").round(3)
+
+
+def run_backtest(df, backends, horizon=28, n_origins=4, step=14, min_train=56, workers=None):
+    tasks = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for product_id, group in df.groupby("product_id"):
+            for backend_name in backends:
+                tasks.append(pool.submit(
+                    backtest_product, backend_name, product_id, group,
+                    horizon, n_origins, step, min_train
+                ))
+
+        rows = []
+        for done, future in enumerate(as_completed(tasks), start=1):
+            rows.extend(future.result())
+            if done % 50 == 0 or done == len(tasks):
+                print(f"  {done}/{len(tasks)} product-backend runs finished")
+
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rolling-origin backtest of the demand forecasting backends")
+    parser.add_argument("--data", help="CSV with product_id, ds, y and optional is_holiday columns")
+    parser.add_argument("--products", type=int, default=20, help="Synthetic products when --data is not given")
+    parser.add_argument("--backends", nargs="*", help="Backends to run (default: all available)")
+    parser.add_argument("--horizon", type=int, default=28)
+    parser.add_argument("--origins", type=int, default=4)
+    parser.add_argument("--step", type=int, default=14)
+    parser.add_argument("--min-train", type=int, default=56)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default="reports")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Demand Forecasting - Rolling-Origin Backtest")
+    print("=" * 60)
+
+    df = load_panel(args.data) if args.data else generate_product_panel(args.products)
+
+    backends = available_backends()
+    selected = args.backends or list(backends)
+    unknown = [name for name in selected if name not in backends]
+    if unknown:
+        parser.error(f"Unavailable backends: {', '.join(unknown)}")
+
+    print(f"Products: {df['product_id'].nunique()}, backends: {', '.join(selected)}")
+    print(f"Horizon {args.horizon} days, {args.origins} origins every {args.step} days\n")
+
+    folds = run_backtest(
+        df, selected, args.horizon, args.origins, args.step, args.min_train, args.workers
+    )
+    summary = summarize(folds)
+
+    os.makedirs(args.output, exist_ok=True)
+    folds.to_csv(os.path.join(args.output, "backtest_folds.csv"), index=False)
+    summary.to_csv(os.path.join(args.output, "backtest_summary.csv"))
+
+    print("\n" + summary.to_string())
+    print("\npeak_mb counts Python allocations only; Prophet's cmdstan fit runs outside tracemalloc's view.")
+    print(f"\nReports written to {args.output}/backtest_summary.csv and {args.output}/backtest_folds.csv")
+
+
+if __name__ == "__main__":
+    main()
@@ -57,9 +57,7 @@ def generate_sample_data():
     return df
 
 
-def train_prophet_model(df):
-    print("\nTraining Prophet model...")
-    
+def build_prophet_model():
     model = Prophet(
         daily_seasonality=False,
         weekly_seasonality=True,
@@ -67,9 +65,14 @@ def train_prophet_model(df):
         seasonality_mode='multiplicative',
         changepoint_prior_scale=0.05
     )
+    model.add_regressor('is_holiday')
+    return model
+
+
+def train_prophet_model(df):
+    print("\nTraining Prophet model...")
     
-    if 'is_holiday' in df.columns:
-        model.add_regressor('is_holiday')
+    model = build_prophet_model()
     
     model.fit(df[['ds', 'y', 'is_holiday']])
     
@@ -87,31 +90,37 @@ def train_prophet_model(df):
 def evaluate_model(model, df):
     print("\nEvaluating model...")
     
-    future = model.make_future_dataframe(periods=30)
-    future['is_holiday'] = 0
-    forecast = model.predict(future)
-    
     train_size = int(len(df) * 0.8)
     train_df = df[:train_size]
     test_df = df[train_size:]
     
-    test_forecast = forecast[forecast['ds'].isin(test_df['ds'])]
+    # Score a model that has not seen the test period, on the test dates
+    # themselves and with their holiday flags.
+    holdout_model = build_prophet_model()
+    holdout_model.fit(train_df[['ds', 'y', 'is_holiday']])
+    test_forecast = holdout_model.predict(test_df[['ds', 'is_holiday']])
     
-    if len(test_forecast) > 0:
-        actual = test_df['y'].values
-        predicted = test_forecast['yhat'].values[:len(actual)]
+    if len(test_df) > 0:
+        actual = test_df['y'].to_numpy()
+        predicted = test_forecast['yhat'].to_numpy()
+        nonzero = actual != 0
         
         mae = np.mean(np.abs(actual - predicted))
         rmse = np.sqrt(np.mean((actual - predicted) ** 2))
-        mape = np.mean(np.abs((actual - predicted) / actual)) * 100
+        mape = np.mean(np.abs((actual[nonzero] - predicted[nonzero]) / actual[nonzero])) * 100
         
         print(f"\nModel Performance Metrics:")
         print(f"  Mean Absolute Error (MAE): {mae:.2f}")
         print(f"  Root Mean Squared Error (RMSE): {rmse:.2f}")
         print(f"  Mean Absolute Percentage Error (MAPE): {mape:.2f}%")
+        print("  Run backtest.py for rolling-origin results across forecasting backends")
     else:
         print("Not enough test data for evaluation")
     
+    future = model.make_future_dataframe(periods=30)
+    future['is_holiday'] = 0
+    forecast = model.predict(future)
+    
     print(f"\nForecast summary (next 30 days):")
     future_forecast = forecast[forecast['ds'] > df['ds'].max()]
     print(f"  Average predicted demand: {future_forecast['yhat'].mean():.2f}")